@@ -0,0 +1,73 @@
+"""
+Benchmark the board searches as the board grows.
+
+Each search runs corner to corner, and between random squares, on a square
+board of each size, with knight moves. The plain BFS is only timed while
+the board is small, and every search is checked against the closed-form
+knight distance.
+
+Usage:
+    python benchmark.py [side ...]
+"""
+
+from __future__ import print_function
+
+import random
+import sys
+import timeit
+
+import solution
+
+# Board sides to benchmark by default
+SIDES = [10, 100, 300, 1000, 3000]
+
+# Largest board side to run the plain BFS on
+BFS_LIMIT = 300
+
+# Number of random queries per board
+QUERIES = 5
+
+
+def best_time(func, repeat=3):
+    """ Return the best time, in seconds, for a single call of func(). """
+    timer = timeit.Timer(func)
+    number = 1
+    while timer.timeit(number) < 0.2 and number < 1000:
+        number *= 10
+    return min(timer.repeat(repeat, number)) / number
+
+
+def main(sides):
+    random.seed(0)
+
+    print('%6s %10s %10s %12s %12s %12s %6s' % (
+        'side', 'from', 'to', 'bfs (s)', 'bidir (s)', 'astar (s)', 'match'))
+
+    for side in sides:
+        grid = solution.Grid(side, side)
+
+        queries = [(0, grid.size - 1)] + [
+            (random.randrange(grid.size), random.randrange(grid.size))
+            for i in range(QUERIES)
+        ]
+
+        for start, end in queries:
+            searches = [grid.bidirectional_bfs, grid.astar]
+            if side <= BFS_LIMIT:
+                searches.insert(0, grid.bfs)
+
+            expected = grid.knight_distance(start, end)
+            match = all(search(start, end, solution.KNIGHT_MOVES) == expected for search in searches)
+
+            times = [
+                '%12.6f' % best_time(lambda: search(start, end, solution.KNIGHT_MOVES))
+                for search in searches
+            ]
+            if side > BFS_LIMIT:
+                times.insert(0, '%12s' % '-')
+
+            print('%6d %10d %10d %s %6s' % (side, start, end, ' '.join(times), match))
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or SIDES)
@@ -1,3 +1,12 @@
+import heapq
+from array import array
+from collections import OrderedDict, deque
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # Fall back to looking up one square at a time
+
 # 8 x8 board
 GRID_SIZE = 8
 
@@ -9,60 +18,415 @@ KNIGHT_MOVES = [
     (-1, 2), (-1, -2),
 ]
 
+# Smallest board side knight_distance() is exact for, without a search
+KNIGHT_MIN_SIDE = 4
+
+# Largest board (in squares) to build an all-pairs distance table for
+TABLE_LIMIT = 256
+
+# Number of distance fields to keep cached
+FIELD_CACHE_SIZE = 64
+
+# Marks in the visited bitmap of the larger searches
+FORWARD, BACKWARD, BLOCKED = 1, 2, 4
+
+# Translation from an obstacle mask (non-zero is blocked) to visited marks
+BLOCKED_MARKS = bytes(bytearray([0] + [BLOCKED] * 255))
+
+
+def knight_distance(dx, dy):
+    """
+    Return the smallest number of knight moves to travel (dx, dy) on an
+    unbounded board.
+
+    Each move covers 3 squares (Manhattan distance) and at most 2 along
+    either axis, so once the longer axis dominates the moves are limited by
+    it, otherwise by the total. Parity then rounds the count up, with two
+    short hops that need a detour.
+    """
+    dx, dy = abs(dx), abs(dy)
+    if dx < dy:
+        dx, dy = dy, dx
+
+    # The two exceptions, which need to double back
+    if dx == 1 and dy == 0:
+        return 3
+    if dx == 2 and dy == 2:
+        return 4
+
+    delta = dx - dy
+    if dy > delta:
+        return delta - 2 * ((delta - dy) // 3)
+    return delta - 2 * ((delta - dy) // 4)
+
+
+class LRUCache:
+    """ A dictionary that only keeps the most recently used maxsize items. """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.items = OrderedDict()
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def get(self, key, default=None):
+        if key not in self.items:
+            return default
+        value = self.items.pop(key)
+        self.items[key] = value  # Now the most recent
+        return value
+
+    def put(self, key, value):
+        self.items.pop(key, None)
+        self.items[key] = value
+        while len(self.items) > self.maxsize:
+            self.items.popitem(last=False)
+
+    def clear(self):
+        self.items.clear()
+
+
+# Distance fields, shared by all boards of the same size
+fields_cache = LRUCache(FIELD_CACHE_SIZE)
+
+
 class Grid:
     def __init__(self, width, height):
         self.width = width
         self.height = height
+        self.size = width * height
+        self.tables = {}
 
     def get_coords(self, pos):
         """ Convert a board position to (x,y) coordinates """
-        return pos % self.width, int(pos / self.height)
+        return pos % self.width, pos // self.width
 
     def get_position(self, col, row):
-        """ Convert a board position to (x,y) coordinates """
+        """ Convert (x,y) coordinates to a board position """
         return row * self.width + col
 
     def valid(self, col, row):
         """ Return true if the (x, y) coordinate is valid """
         return col >= 0 and col < self.width and row >= 0 and row < self.height
 
+    def is_corner(self, col, row):
+        """ Return true if the (x, y) coordinate is a corner of the board """
+        return col in (0, self.width - 1) and row in (0, self.height - 1)
+
+    def steps(self, moves):
+        """ Return each move as (x, y, change in board position). """
+        return [(x, y, self.get_position(x, y)) for x, y in moves]
+
+    def visited_map(self, blocked=None):
+        """
+        Return a visited bitmap for the board, one byte per square indexed by
+        board position, with any squares blocked by an obstacle mask (a
+        bytes-like object, non-zero where blocked) already marked.
+        """
+        if blocked is None:
+            return bytearray(self.size)
+        if len(blocked) != self.size:
+            raise ValueError('obstacle mask does not match the board')
+        return bytearray(blocked).translate(BLOCKED_MARKS)
+
+    def heuristic(self, moves):
+        """
+        Return an admissible (and consistent) estimate of the steps between
+        two squares for a set of moves, as a function of the square's (dx, dy).
+
+        A single move changes the x distance by at most the longest x step,
+        the y distance by the longest y step, and the Manhattan distance by
+        the longest step overall, so it takes at least as many moves as the
+        largest of those ratios.
+        """
+        max_x = max(abs(x) for x, y in moves)
+        max_y = max(abs(y) for x, y in moves)
+        max_xy = max(abs(x) + abs(y) for x, y in moves)
+
+        def estimate(dx, dy):
+            dx, dy = abs(dx), abs(dy)
+            steps = -(-(dx + dy) // max_xy)
+            if max_x:
+                steps = max(steps, -(-dx // max_x))
+            if max_y:
+                steps = max(steps, -(-dy // max_y))
+            return steps
+
+        return estimate
+
     def bfs(self, start, end, moves):
         """ Find the shortest path from A to B using a simple BFS """
 
         # Simple queue of possible moves
-        queue = [(start, 0)]
+        queue = deque([(start, 0)])
 
-        # List of squares already visited
-        visited = []
+        # Set of squares already queued
+        visited = set([start])
 
         # Loop through the list of moves until we land on the destination
         while queue:
             # Get next move
-            current_position, current_steps = queue.pop(0)
-            current_col, current_row = self.get_coords(current_position)
+            current_position, current_steps = queue.popleft()
 
             # Check if destination reached
             if current_position == end:
                 return current_steps
 
-            # Check if already visited
-            if current_position in visited:
+            # Add all valid moves not yet visited to the queue
+            current_col, current_row = self.get_coords(current_position)
+            for x, y in moves:
+                col, row = current_col + x, current_row + y
+                if not self.valid(col, row):
+                    continue
+
+                position = self.get_position(col, row)
+                if position not in visited:
+                    visited.add(position)
+                    queue.append((position, current_steps + 1))
+
+        # No path, which is only possible on very small boards
+        return -1
+
+    def bidirectional_bfs(self, start, end, moves, blocked=None):
+        """
+        Find the shortest path from A to B by searching from both ends at
+        once, expanding a whole layer of the smaller frontier at a time.
+
+        Squares are marked in a visited bitmap as they are reached from each
+        end, and the first square reached from both ends closes the path.
+        The search from B follows the moves backwards, so any move set works.
+        Returns -1 if there is no path.
+        """
+        width, height = self.width, self.height
+        visited = self.visited_map(blocked)
+        if visited[start] or visited[end]:
+            return -1
+        if start == end:
+            return 0
+
+        visited[start] = FORWARD
+        visited[end] = BACKWARD
+
+        # Frontier, steps taken and moves for each direction
+        searches = [
+            [[start], 0, self.steps(moves), FORWARD, BACKWARD],
+            [[end], 0, self.steps([(-x, -y) for x, y in moves]), BACKWARD, FORWARD],
+        ]
+
+        while searches[0][0] and searches[1][0]:
+            # Expand the smaller frontier by one layer
+            search = min(searches, key=lambda search: len(search[0]))
+            frontier, depth, steps, mark, other = search
+
+            next_frontier = []
+            for position in frontier:
+                row, col = divmod(position, width)
+
+                for x, y, delta in steps:
+                    c, r = col + x, row + y
+                    if c < 0 or c >= width or r < 0 or r >= height:
+                        continue
+
+                    neighbour = position + delta
+                    seen = visited[neighbour]
+                    if not seen:
+                        visited[neighbour] = mark
+                        next_frontier.append(neighbour)
+                    elif seen == other:
+                        # Met the other search on its own frontier
+                        return searches[0][1] + searches[1][1] + 1
+
+            search[0], search[1] = next_frontier, depth + 1
+
+        return -1
+
+    def astar(self, start, end, moves, blocked=None):
+        """
+        Find the shortest path from A to B with an A* search, guided by the
+        heuristic() for the move set.
+
+        As the heuristic is consistent, a square's steps are final the first
+        time it is taken off the heap, so it is closed in a visited bitmap
+        and never expanded again. Returns -1 if there is no path.
+        """
+        width, height = self.width, self.height
+        visited = self.visited_map(blocked)
+        if visited[start] or visited[end]:
+            return -1
+
+        estimate = self.heuristic(moves)
+        steps = self.steps(moves)
+        end_col, end_row = self.get_coords(end)
+
+        # Best steps found so far to each open square
+        best = {start: 0}
+
+        # Heap of (estimated total, -steps, square), preferring deeper squares
+        # between equal estimates
+        start_col, start_row = self.get_coords(start)
+        heap = [(estimate(end_col - start_col, end_row - start_row), 0, start)]
+
+        while heap:
+            total, current_steps, position = heapq.heappop(heap)
+            current_steps = -current_steps
+
+            # Skip squares already closed by a shorter route
+            if visited[position]:
                 continue
 
-            # Get all valid moves and add them to the queue
-            queue.extend([
-                (self.get_position(current_col + x, current_row + y), current_steps + 1)
-                for x, y in moves if self.valid(current_col + x, current_row + y)
-            ])
+            if position == end:
+                return current_steps
 
-        # Should never happen
-        assert False
+            visited[position] = FORWARD
+            del best[position]
 
-def solution(src, dest):
-    # Create the 8x8 grid (0..63)
-    grid = Grid(GRID_SIZE, GRID_SIZE)
+            next_steps = current_steps + 1
+            row, col = divmod(position, width)
+            for x, y, delta in steps:
+                c, r = col + x, row + y
+                if c < 0 or c >= width or r < 0 or r >= height:
+                    continue
+
+                neighbour = position + delta
+                if visited[neighbour] or best.get(neighbour, next_steps + 1) <= next_steps:
+                    continue
+
+                best[neighbour] = next_steps
+                heapq.heappush(heap, (
+                    next_steps + estimate(end_col - c, end_row - r),
+                    -next_steps,
+                    neighbour,
+                ))
+
+        return -1
+
+    def distances_from(self, start, moves):
+        """
+        Return the number of steps from start to every square, as an array
+        indexed by board position (-1 where it can't be reached).
+        """
+        width, height = self.width, self.height
+        moves = self.steps(moves)
+
+        steps = array('i', [-1]) * self.size
+        steps[start] = 0
+
+        # Expand a whole layer at a time, so every square in it is the same
+        # number of steps away
+        frontier, depth = [start], 0
+        while frontier:
+            depth += 1
+            next_frontier = []
+
+            for position in frontier:
+                row, col = divmod(position, width)
+                for x, y, delta in moves:
+                    c, r = col + x, row + y
+                    if c < 0 or c >= width or r < 0 or r >= height:
+                        continue
+
+                    neighbour = position + delta
+                    if steps[neighbour] < 0:
+                        steps[neighbour] = depth
+                        next_frontier.append(neighbour)
+
+            frontier = next_frontier
 
-    # Calculate the shortest number of steps from src to dest
-    steps = grid.bfs(src, dest, KNIGHT_MOVES)
+        return steps
+
+    def distance_field(self, src, moves):
+        """
+        Return the number of steps from src to every square as an
+        array('i') indexed by board position (-1 where it can't be reached),
+        from a single BFS. The most recent fields are cached, keyed on the
+        board size, moves and src.
+        """
+        key = (self.width, self.height, tuple(moves), src)
+
+        field = fields_cache.get(key)
+        if field is None:
+            field = self.distances_from(src, moves)
+            fields_cache.put(key, field)
+
+        return field
+
+    def distance(self, src, dest, moves):
+        """ Find the shortest path from A to B, from A's distance field. """
+        return self.distance_field(src, moves)[dest]
+
+    def distances(self, src, dests, moves):
+        """
+        Find the shortest paths from A to each of a list of squares, as a
+        list, gathering them from A's distance field all at once.
+        """
+        field = self.distance_field(src, moves)
+        if np is None:
+            return [field[dest] for dest in dests]
+
+        return np.frombuffer(field, dtype=np.intc)[np.asarray(dests, dtype=np.intp)].tolist()
+
+    def distance_table(self, moves):
+        """
+        Return the all-pairs distance table for a set of moves, as a flat
+        array('b') where table[start * size + end] is the number of steps
+        (-1 where it can't be reached). Tables are built once per board.
+        """
+        key = tuple(moves)
+        table = self.tables.get(key)
+        if table is not None:
+            return table
+
+        if self.size > TABLE_LIMIT:
+            raise ValueError('board too large for a distance table')
+
+        table = array('b')
+        for start in range(self.size):
+            steps = self.distances_from(start, moves)
+            if max(steps) > 127:
+                raise ValueError('distances too long for a distance table')
+            table.fromlist(steps.tolist())
+
+        self.tables[key] = table
+        return table
+
+    def knight_distance(self, start, end):
+        """
+        Find the smallest number of knight moves from A to B in O(1), falling
+        back to a BFS on boards too narrow for the closed form.
+        """
+        if min(self.width, self.height) < KNIGHT_MIN_SIDE:
+            return self.bfs(start, end, KNIGHT_MOVES)
+
+        start_col, start_row = self.get_coords(start)
+        end_col, end_row = self.get_coords(end)
+        dx, dy = end_col - start_col, end_row - start_row
+        corners = self.is_corner(start_col, start_row), self.is_corner(end_col, end_row)
+
+        # A diagonal step out of a corner can't use the squares beyond it
+        if abs(dx) == 1 and abs(dy) == 1 and any(corners):
+            return 4
+
+        # Nor can a hop between the corners of a side of 4 squares
+        if all(corners) and (
+            (dy == 0 and abs(dx) == 3 == self.width - 1) or
+            (dx == 0 and abs(dy) == 3 == self.height - 1)
+        ):
+            return 5
+
+        return knight_distance(dx, dy)
+
+
+# The board, which caches its distance tables
+BOARD = Grid(GRID_SIZE, GRID_SIZE)
+
+
+def solution(src, dest):
+    # Look up the shortest number of steps from src to dest on the 8x8 grid
+    # (0..63), from a table built on first use
+    table = BOARD.distance_table(KNIGHT_MOVES)
 
-    return steps
+    return table[src * BOARD.size + dest]
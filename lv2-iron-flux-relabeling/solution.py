@@ -1,3 +1,17 @@
+from itertools import islice
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # Fall back to the pure Python parent()
+
+# Tallest tree whose labels fit the fixed-width NumPy path
+MAX_FIXED_HEIGHT = 63
+
+# Number of nodes in each chunk of a stream
+CHUNK_SIZE = 1 << 16
+
+
 def find_parent(node, root, size):
     """
     Recurse the current branch to find the parent node.
@@ -34,27 +48,386 @@ def find_parent(node, root, size):
     return find_parent(node, branch, size >> 1)
 
 
+def node_height(node):
+    """
+    Return the height of the subtree rooted at a node (1 for a leaf).
+
+           7
+         3   6
+        1 2 4 5
+
+    Assumptions:
+    1. A subtree of height k has 2^k - 1 nodes, so a node whose label is all
+       ones in binary (2^k - 1) is the root of the leftmost subtree of
+       height k
+    2. Any other node is in the right branch of the largest all-ones
+       subtree below it, so subtracting that subtree's size (one less than
+       the node's top bit) gives the same node in the left branch, which
+       has the same height
+    """
+    while node & (node + 1):
+        node -= (1 << (node.bit_length() - 1)) - 1
+    return node.bit_length()
+
+
+def parent(node, h):
+    """
+    Return the parent of a node, without walking down from the root.
+
+    Assumptions:
+    1. Post-order puts a right branch directly before its parent, so the
+       parent of a right branch is node + 1
+    2. A left branch is followed by its sibling's leftmost leaf (height 1),
+       and then the whole sibling, which is the same size as the left
+       branch, so the parent of a left branch of height k is node + 2^k
+    """
+    # Check node is in range (the root has no parent)
+    if node < 1 or node >= (1 << h) - 1:
+        return -1
+
+    # Parent follows a right branch directly
+    if node_height(node + 1) != 1:
+        return node + 1
+
+    return node + (1 << node_height(node))
+
+
+def fixed_labels(h, q):
+    """
+    Return an array of labels as uint64, with anything below 1 (which is out
+    of range anyway) as 0.
+    """
+    if h > MAX_FIXED_HEIGHT:
+        raise ValueError('tree too tall for fixed-width labels')
+
+    q = np.asarray(q)
+    if q.dtype.kind == 'i':
+        q = np.maximum(q, 0)
+    return q.astype(np.uint64, copy=False)
+
+
+def branch_heights(h, q):
+    """
+    Return the height of every node in a uint64 array of nodes in the tree,
+    and whether each is a right branch, with NumPy.
+
+    The all-ones subtree sizes are removed in the same way as node_height(),
+    but one bit at a time from the top, for all the nodes at once. Below bit
+    j + 1, a node has top bit j if it is at least 2^j, and is all ones only
+    if it is 2^(j+1) - 1, so no bit lengths are needed. A node is a right
+    branch if the last subtree removed was the same height as its own (its
+    left sibling).
+    """
+    node = np.array(q, dtype=np.uint64)
+    k = np.zeros(node.shape, dtype=np.int64)
+    right = np.zeros(node.shape, dtype=bool)
+    removed = np.zeros(node.shape, dtype=bool)
+
+    for j in range(h - 1, -1, -1):
+        top = np.uint64(1 << j)
+
+        # Nodes that are all ones are done (0 is never touched again)
+        done = node == np.uint64((1 << (j + 1)) - 1)
+        if done.any():
+            k[done] = j + 1
+            right |= done & removed
+            node[done] = 0
+
+        removed = node >= top
+        node -= removed * (top - np.uint64(1))
+
+    return k, right
+
+
+def subtree_heights(h, q):
+    """
+    Return the height of the subtree rooted at every node in an array, with
+    NumPy (-1 for nodes outside the tree).
+    """
+    q = fixed_labels(h, q)
+    k = np.full(q.shape, -1, dtype=np.int64)
+
+    inside = np.flatnonzero((q >= 1) & (q <= np.uint64((1 << h) - 1)))
+    k[inside] = branch_heights(h, q[inside])[0]
+    return k
+
+
+def parents(h, q):
+    """
+    Return the parent of every node in an array, with NumPy (-1 for nodes
+    outside the tree, and for the root).
+
+    Uses the same rule as parent(), for all the nodes at once. Labels are
+    held as uint64, so h can be up to MAX_FIXED_HEIGHT.
+    """
+    q = fixed_labels(h, q)
+    p = np.full(q.shape, -1, dtype=np.int64)
+
+    inside = np.flatnonzero((q >= 1) & (q < np.uint64((1 << h) - 1)))
+    node = q[inside].astype(np.int64)
+    k, right = branch_heights(h, node)
+
+    # Parent follows a right branch directly, otherwise it is 2^k after a
+    # left branch of height k
+    p[inside] = node + np.where(right, 1, np.left_shift(1, k))
+    return p
+
+
+def common_ancestors(h, a, b):
+    """
+    Return the lowest common ancestor of each pair of nodes in two arrays,
+    with NumPy (-1 where either is outside the tree).
+
+    Descends from the root for all the pairs at once, stopping each pair at
+    the branch where it splits up (or reaches one of the nodes).
+    """
+    a, b = np.broadcast_arrays(fixed_labels(h, a), fixed_labels(h, b))
+    lca = np.full(a.shape, -1, dtype=np.int64)
+
+    root = (1 << h) - 1
+    active = (a >= 1) & (a <= root) & (b >= 1) & (b <= root)
+    branch = np.full(a.shape, root, dtype=np.uint64)
+    size = root >> 1
+
+    while active.any():
+        right = branch - 1
+        left = right - size
+
+        # Stop at the nodes, or where the pair branch different ways
+        found = active & ((a == branch) | (b == branch) | ((a <= left) != (b <= left)))
+        lca[found] = branch[found]
+        active &= ~found
+
+        branch = np.where(a <= left, left, right)
+        size >>= 1
+
+    return lca
+
+
+def stream_parents(h, nodes, chunksize=CHUNK_SIZE):
+    """
+    Yield the parents of a stream of nodes, in chunks of up to chunksize.
+
+    nodes can be any iterable of labels, as ints or as strings (so a file
+    of one label per line can be passed straight in). Trees up to
+    MAX_FIXED_HEIGHT tall are solved with parents(), yielding int64
+    arrays; taller trees (or without NumPy) use parent() on Python ints,
+    yielding lists.
+    """
+    nodes = iter(nodes)
+    fixed = np is not None and h <= MAX_FIXED_HEIGHT
+
+    while True:
+        chunk = [int(node) for node in islice(nodes, chunksize)]
+        if not chunk:
+            return
+
+        if fixed:
+            try:
+                yield parents(h, np.array(chunk, dtype=np.uint64))
+                continue
+            except (OverflowError, ValueError):
+                pass  # Labels outside uint64, so use Python ints
+
+        yield [parent(node, h) for node in chunk]
+
+
+def stream_file(h, path, chunksize=CHUNK_SIZE):
+    """ Yield the parents of the nodes in a file, one label per line. """
+    with open(path) as f:
+        for chunk in stream_parents(h, f, chunksize):
+            yield chunk
+
+
+class PostOrderTree:
+    """
+    A perfect binary tree of height h, labelled in post-order, that answers
+    queries from the labels alone, without building the tree.
+
+           7
+         3   6
+        1 2 4 5
+
+    Assumptions:
+    1. A node of height k (node_height()) roots a subtree of 2^k - 1 nodes,
+       which ends with the node itself
+    2. Its right branch is node - 1, and its left branch is the right
+       branch less the right branch's 2^(k-1) - 1 nodes, so node - 2^(k-1)
+    3. Depth is h - k, so the root is at depth 0
+
+    As with find_parent(), nodes outside the tree give -1. The batched
+    methods take lists (or arrays) of nodes, and use NumPy for trees up to
+    MAX_FIXED_HEIGHT tall when it is available.
+    """
+
+    def __init__(self, h):
+        self.h = h
+        self.root = (1 << h) - 1
+
+    def contains(self, node):
+        """ Return true if the node is in the tree. """
+        return 1 <= node <= self.root
+
+    def fixed(self):
+        """ Return true if batches can use the fixed-width NumPy path. """
+        return np is not None and self.h <= MAX_FIXED_HEIGHT
+
+    def parent(self, node):
+        """ Return the parent of a node (-1 for the root). """
+        return parent(node, self.h)
+
+    def height(self, node):
+        """ Return the height of the subtree rooted at a node. """
+        if not self.contains(node):
+            return -1
+        return node_height(node)
+
+    def depth(self, node):
+        """ Return the number of steps from the root to a node. """
+        if not self.contains(node):
+            return -1
+        return self.h - node_height(node)
+
+    def children(self, node):
+        """ Return the (left, right) branches of a node, (-1, -1) for a leaf. """
+        k = self.height(node)
+        if k <= 1:
+            return -1, -1
+        return node - (1 << (k - 1)), node - 1
+
+    def subtree(self, node):
+        """ Return the (first, last) labels of the subtree rooted at a node. """
+        k = self.height(node)
+        if k < 1:
+            return -1, -1
+        return node - (1 << k) + 2, node
+
+    def ancestors(self, node):
+        """ Return the list of nodes from the root down to a node. """
+        if not self.contains(node):
+            return []
+
+        branch, size = self.root, self.root >> 1
+        path = [branch]
+
+        while branch != node:
+            right = branch - 1
+            left = right - size
+            branch = left if node <= left else right
+            size >>= 1
+            path.append(branch)
+
+        return path
+
+    def lca(self, a, b):
+        """ Return the lowest common ancestor of two nodes. """
+        if not (self.contains(a) and self.contains(b)):
+            return -1
+
+        branch, size = self.root, self.root >> 1
+
+        while a != branch and b != branch:
+            right = branch - 1
+            left = right - size
+
+            # Stop where a and b branch different ways
+            if (a <= left) != (b <= left):
+                break
+
+            branch = left if a <= left else right
+            size >>= 1
+
+        return branch
+
+    def path(self, a, b):
+        """ Return the list of nodes from a up to their common ancestor and down to b. """
+        up, down = self.ancestors(a), self.ancestors(b)
+        if not (up and down):
+            return []
+
+        # Length of the shared part, from the root
+        common = 0
+        for x, y in zip(up, down):
+            if x != y:
+                break
+            common += 1
+
+        return up[:common - 1:-1] + down[common - 1:]
+
+    def parents(self, nodes):
+        """ Return the parent of each node. """
+        if self.fixed():
+            return parents(self.h, nodes)
+        return [self.parent(node) for node in nodes]
+
+    def depths(self, nodes):
+        """ Return the depth of each node. """
+        if self.fixed():
+            k = subtree_heights(self.h, nodes)
+            return np.where(k < 0, -1, self.h - k)
+        return [self.depth(node) for node in nodes]
+
+    def heights(self, nodes):
+        """ Return the height of each node's subtree. """
+        if self.fixed():
+            return subtree_heights(self.h, nodes)
+        return [self.height(node) for node in nodes]
+
+    def all_children(self, nodes):
+        """ Return the (left, right) branches of each node, as two lists. """
+        if not self.fixed():
+            return tuple(map(list, zip(*[self.children(node) for node in nodes]))) or ([], [])
+
+        q = fixed_labels(self.h, nodes).astype(np.int64)
+        k = self.heights(nodes)
+        inner = k > 1
+
+        left = np.where(inner, q - np.left_shift(1, np.maximum(k - 1, 0)), -1)
+        right = np.where(inner, q - 1, -1)
+        return left, right
+
+    def subtrees(self, nodes):
+        """ Return the (first, last) labels of each node's subtree, as two lists. """
+        if not self.fixed():
+            return tuple(map(list, zip(*[self.subtree(node) for node in nodes]))) or ([], [])
+
+        q = fixed_labels(self.h, nodes).astype(np.int64)
+        k = self.heights(nodes)
+        valid = k > 0
+
+        first = np.where(valid, q - np.left_shift(1, np.maximum(k, 0)) + 2, -1)
+        last = np.where(valid, q, -1)
+        return first, last
+
+    def lcas(self, a, b):
+        """ Return the lowest common ancestor of each pair of nodes. """
+        if self.fixed():
+            return common_ancestors(self.h, a, b)
+        return [self.lca(x, y) for x, y in zip(a, b)]
+
+    def paths(self, a, b):
+        """ Return the path between each pair of nodes. """
+        return [self.path(x, y) for x, y in zip(a, b)]
+
+
 def solution(h, q):
     """
     Return the list of parent nodes for each element in q.
 
     Assumptions:
-    - h is the height of the tree, in the range 1..30
+    - h is the height of the tree, at least 1 (originally up to 30)
     - root of the tree is 2^h - 1
-    - q is the list of nodes (1..10000 nodes)
-    - p is the list of parent nodes (1..10000 nodes)
+    - q is the list of nodes (at least 1 node, originally up to 10000)
+    - p is the list of parent nodes
+
+    Labels are Python ints, so there is no upper limit on either; see
+    stream_parents() for inputs too large to hold in a list.
     """
     # Check h and q are within bounds
-    if h < 1 or h > 30 or len(q) < 1 or len(q) > 10000:
+    if h < 1 or len(q) < 1:
         return
 
-    # Root is 2^h - 1
-    root = 2 ** h - 1
-
-    # Size is root / 2
-    size = root >> 1
-
     # Get the list of parent nodes for each element in q
-    p = [find_parent(node, root, size) for node in q]
-    
+    p = [parent(node, h) for node in q]
+
     return p
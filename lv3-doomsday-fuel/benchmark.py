@@ -0,0 +1,118 @@
+"""
+Benchmark the exact integer solver against the original float solver.
+
+The original solver converted each probability to a float, inverted (I - Q)
+through cofactors and then guessed the fractions back with
+Fraction.limit_denominator(). It is factorial in the number of transient
+states, so it is only timed while that stays small.
+
+Usage:
+    python benchmark.py [size ...]
+"""
+
+from __future__ import print_function
+
+import random
+import sys
+import timeit
+from fractions import Fraction
+from functools import reduce
+
+import solution
+
+# Sizes (number of states) to benchmark by default
+SIZES = [10, 20, 50, 100, 200]
+
+# Largest number of transient states to run the original solver with
+LEGACY_LIMIT = 7
+
+
+def legacy_solution(M):
+    """ The original float round-trip solver, kept for comparison. """
+    denominators = [sum(row) for row in M]
+    n = denominators.count(0)
+
+    if n == len(M):
+        return [1, 1]
+
+    # Standard form, as floats
+    P = [
+        [float(c) / denominators[j] for i, c in enumerate(row) if not denominators[i]] +
+        [float(c) / denominators[j] for i, c in enumerate(row) if denominators[i]]
+        for j, row in enumerate(M) if denominators[j]
+    ]
+    R = [row[:n] for row in P]
+    Q = [row[n:] for row in P]
+
+    # F = (I - Q)^-1, through cofactors
+    A = [[int(i == j) - c for j, c in enumerate(row)] for i, row in enumerate(Q)]
+    d = solution.determinant(A)
+    if len(A) == 1:
+        F = [[1.0 / d]]
+    else:
+        F = [[c / float(d) for c in row] for row in solution.adjugate_matrix(A)]
+
+    # First row of FR, guessed back into fractions
+    probabilities = [
+        Fraction(sum(f * r[j] for f, r in zip(F[0], R))).limit_denominator()
+        for j in range(n)
+    ]
+    lcd = reduce(solution.lcm, [fraction.denominator for fraction in probabilities])
+
+    return [int(x.numerator * lcd // x.denominator) for x in probabilities] + [lcd]
+
+
+def exact_solution(M):
+    """ Solve M with the exact solver, without reusing a cached result. """
+    solution.results_cache.clear()
+    solution.plans_cache.clear()
+    return solution.solution(M)
+
+
+def random_matrix(size, transient, density=0.3, weight=100):
+    """
+    Return a random size x size matrix with the given number of transient
+    states, each of which has a direct route to an absorbing state.
+    """
+    M = [[0] * size for j in range(size)]
+    for j in range(transient):
+        row = M[j]
+        for i in range(size):
+            if random.random() < density:
+                row[i] = random.randint(1, weight)
+        row[random.randrange(transient, size)] += random.randint(1, weight)
+    return M
+
+
+def best_time(func, M, repeat=3):
+    """ Return the best time, in seconds, for a single call of func(M). """
+    timer = timeit.Timer(lambda: func(M))
+    number = 1
+    while timer.timeit(number) < 0.2 and number < 1000:
+        number *= 10
+    return min(timer.repeat(repeat, number)) / number
+
+
+def main(sizes):
+    random.seed(0)
+
+    print('%6s %9s %12s %12s %8s' % ('states', 'transient', 'exact (s)', 'legacy (s)', 'match'))
+
+    for size in sizes:
+        # Keep the original solver in range on the smallest matrix
+        transient = min(size // 2, LEGACY_LIMIT) if size <= 10 else size // 2
+        M = random_matrix(size, transient)
+
+        exact = best_time(exact_solution, M)
+
+        if transient <= LEGACY_LIMIT:
+            legacy = '%12.6f' % best_time(legacy_solution, M)
+            match = str(legacy_solution(M) == exact_solution(M))
+        else:
+            legacy, match = '%12s' % '-', '-'
+
+        print('%6d %9d %12.6f %s %8s' % (size, transient, exact, legacy, match))
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or SIZES)
@@ -32,16 +32,77 @@ Solution:
     5. First line of FR contains probabilities
     6. Calculate lowest common denominator
     7. Return array of numerators and common denominator
+
+Exact solution:
+
+    Inverting (I - Q) through cofactors is factorial in the number of
+    transient states, so only the start row of FR is solved for instead.
+
+    Scaling each transient row by its row sum d gives integer matrices:
+
+      A = D - Q'    (Q' = raw transient counts, D = diag(d))
+      R' = D.R      (R' = raw absorbing counts)
+
+    So FR = A^-1 . R', and the first row of FR is y.R' where y solves:
+
+      A^T . y = e0
+
+    Fraction-free (Bareiss) Gaussian elimination solves this system using
+    only Python ints, returning y scaled by a common denominator.
+
+Sparse solution:
+
+    Most chains are mostly zeros, so each row is stored as a dict of
+    {state: count} instead, and states that can't be reached from state 0
+    are pruned before solving.
+
+    Transient states other than 0 are then eliminated from the rows of
+    [I - Q | R] one at a time. Eliminating state k from a row i that leads
+    to it, with a = count(i -> k) and e = total(k), gives:
+
+      row(i) = e * row(i) + a * row(k)
+
+    Any resulting self loop is dropped, as it only repeats the same step and
+    doesn't change where the ore ends up. Once every other transient state
+    is eliminated, row 0 only leads to absorbing states, so it is the start
+    row of FR scaled by its row sum.
+
+    As all counts are non-negative the work grows with the edges (and the
+    fill-in from elimination), not with n^2.
 """
 
+import heapq
 import operator
-from fractions import Fraction, gcd
+from collections import OrderedDict, namedtuple
+from functools import reduce
+try:
+    from math import gcd
+except ImportError:
+    from fractions import gcd
+from fractions import Fraction
 from itertools import starmap
 
+try:
+    import numpy as np
+except ImportError:
+    np = None  # Only needed for the fast solver
+
+# Default number of results kept by solve_many
+CACHE_SIZE = 4096
+
+# Default number of elimination plans kept by solve_many
+PLAN_CACHE_SIZE = 256
+
+# The partition and elimination order for a sparse zero pattern
+Plan = namedtuple('Plan', ['absorbing', 'transient', 'order'])
+
+# Largest estimated relative error accepted from the fast solver
+TOLERANCE = 1e-9
+
 
 def lcm(a, b):
     """ Return the lowest common multiple of two integers. """
-    return int(a * b / gcd(a, b))
+    return a * b // gcd(a, b)
 
 
 def determinant(A):
@@ -82,14 +143,14 @@ def zero_matrix(size):
     return [[0] * size for j in range(size)]
 
 
-def identity_matrix(size):
-    """ Return an identity matrix of size x size. """
-    M = zero_matrix(size)
-    for x in range(size):
-        M[x][x] = 1.0
+def diagonal_matrix(values):
+    """ Return a square matrix with values along the diagonal. """
+    M = zero_matrix(len(values))
+    for x, value in enumerate(values):
+        M[x][x] = value
     return M
 
-    
+
 def transpose_matrix(A):
     """ Return a transpose of matrix A. """
     return list(map(list, zip(*A)))
@@ -129,43 +190,12 @@ def adjugate_matrix(A):
     return transpose_matrix(cofactor_matrix(A))
 
 
-def invert_matrix(A):
-    """
-    Return the inverse of matrix A.
-
-        A^-1 = 1 / det(A) * adj(A)
-
-    1. Calculate determinant.
-    2. Calculate adjoint matrix.
-    3. Multiply 1/determinant by adjoint matrix.
-    """
-
-    # Calculate determinant
-    d = determinant(A)
-
-    if d == 0:
-        assert False  # TODO: Raise exception
-
-    # Special case for 2x2 matrix:
-    if len(A) == 2:
-        return [
-            [A[1][1] / d, -1 * A[0][1] / d],
-            [-1 * A[1][0] / d, A[0][0] / d]
-        ]
-
-    # Calculant adjoint matrix
-    C = adjugate_matrix(A)
-
-    # 1 / det(A) * adj(A)
-    return [[c / float(d) for c in row] for row in C]
-
-
 def multiply_matrices(A, B):
     """ Return a matrix that is the product matrix A * B. """
 
     # Check matrices are compatible
     if len(A[0]) != len(B):
-        assert False  # TODO: Raise exception
+        raise ValueError('Matrices are not compatible')
 
     return [[sum(starmap(operator.mul, zip(a_row, b_col))) for b_col in zip(*B)] for a_row in A]
 
@@ -176,13 +206,20 @@ def subtract_matrices(a, b):
 
 
 def transform_matrix(A):
-    """ Transform matrix A into standard form. """
+    """
+    Transform matrix A into standard form.
+
+    Returns (P, denominators), where each row of P holds integer counts and
+    the matching denominator is its row sum, so no fractions are created.
+    Absorbing rows are the identity, with a denominator of 1.
+    """
 
     # Get the sums for each row
     denominators = [sum(row) for row in A]
 
     # Absorbing and transient states
     absorbing_states, transient_states = [], []
+    absorbing_denominators, transient_denominators = [], []
 
     # Order the colums with absorbing states first and separate the matrix into I, O, R and Q
     for j, row in enumerate(list(A)):
@@ -191,40 +228,535 @@ def transform_matrix(A):
             z = [int(i == j) for i in range(len(row)) if not denominators[i]]
             x = [0] * (len(row) - len(z))
             absorbing_states.append(z + x)
+            absorbing_denominators.append(1)
         else:
-            z = [float(c) / denominators[j] for i, c in enumerate(row) if not denominators[i]]
-            x = [float(c) / denominators[j] for i, c in enumerate(row) if denominators[i]]
+            z = [c for i, c in enumerate(row) if not denominators[i]]
+            x = [c for i, c in enumerate(row) if denominators[i]]
             transient_states.append(z + x)
+            transient_denominators.append(denominators[j])
 
     # Return the standard matrix
-    return absorbing_states + transient_states
+    return (
+        absorbing_states + transient_states,
+        absorbing_denominators + transient_denominators
+    )
 
 
-def solution(M):
-    # Get number of absorbing states
-    n = len([i for i, row in enumerate(M) if sum(row) == 0])
+def bareiss_solve(A, b):
+    """
+    Solve A.x = b exactly using fraction-free (Bareiss) Gaussian elimination.
+
+    Returns (X, d) where x = X / d, with X a list of ints and d an int.
+
+    Forward elimination keeps every entry an integer, as each update is
+    exactly divisible by the previous pivot:
+
+      a[i][j] = (a[k][k] * a[i][j] - a[i][k] * a[k][j]) / p
+
+    The last pivot d is the determinant of A (up to sign), so by Cramer's rule
+    d.x is integral and back substitution can also be done fraction-free:
+
+      X[i] = (d * b[i] - sum(a[i][j] * X[j] for j > i)) / a[i][i]
+    """
+    n = len(A)
+
+    # Augmented matrix [A | b], copied as A is modified in place
+    A = [list(row) + [c] for row, c in zip(A, b)]
+
+    # Forward elimination
+    prev = 1
+    for k in range(n):
+        # Find a non-zero pivot and swap it into place
+        p = next((j for j in range(k, n) if A[j][k]), None)
+        if p is None:
+            raise ValueError('Matrix is singular')
+        if p != k:
+            A[k], A[p] = A[p], A[k]
+
+        pivot, pivot_row = A[k][k], A[k]
+        for row in A[k + 1:]:
+            a = row[k]
+            for j in range(k + 1, n + 1):
+                row[j] = (pivot * row[j] - a * pivot_row[j]) // prev
+            row[k] = 0
+
+        prev = pivot
+
+    # Back substitution, with X scaled by the final pivot
+    d = prev
+    X = [0] * n
+    for i in range(n - 1, -1, -1):
+        row = A[i]
+        total = d * row[n] - sum(row[j] * X[j] for j in range(i + 1, n))
+        X[i] = total // row[i]
+
+    return X, d
+
+
+def simplify(numerators, denominator):
+    """
+    Return the numerators followed by the denominator, in simplest form.
+
+    This is the only place the common denominator is reduced, and the
+    denominator is kept positive.
+    """
+    divisor = abs(reduce(gcd, numerators, denominator))
+    if denominator < 0:
+        divisor = -divisor
+
+    return [c // divisor for c in numerators] + [denominator // divisor]
+
+
+def absorption_probabilities(M):
+    """
+    Return the absorption probabilities from state 0 for matrix M.
+
+    The result is the list of numerators for each absorbing state, followed
+    by their common denominator, in simplest form.
+    """
 
-    if n == len(M):
-        return [1, 1]  # No transient states
+    # Special case for starting in an absorbing state
+    if not sum(M[0]):
+        return [int(i == 0) for i, row in enumerate(M) if not sum(row)] + [1]
 
-    # Tranform the matrix into standard form
-    P = transform_matrix(M)
+    # Tranform the matrix into standard form, as integer counts
+    P, denominators = transform_matrix(M)
 
-    # Get R and Q
+    # Get number of absorbing states
+    n = len([row for row in M if not sum(row)])
+
+    # Get R' and Q'
     R = [row[:n] for row in P[n:]]
     Q = [row[n:] for row in P[n:]]
 
-    # Calculate F = (I - Q)^1
-    F = invert_matrix(subtract_matrices(identity_matrix(len(Q)), Q))
+    # Calculate A = D - Q'
+    A = subtract_matrices(diagonal_matrix(denominators[n:]), Q)
+
+    # Solve A^T . y = e0 (state 0 is always the first transient state)
+    Y, d = bareiss_solve(transpose_matrix(A), [1] + [0] * (len(A) - 1))
+
+    # Calculate y.R' to give the numerators over the common denominator d
+    return simplify(multiply_matrices([Y], R)[0], d)
+
+
+def sparse_matrix(M):
+    """
+    Return matrix M as a list of {column: value} dicts, without any zeros.
+
+    Rows that are already dicts are copied, so a sparse chain doesn't need
+    to be built as a dense matrix first.
+    """
+    return [
+        {j: c for j, c in (row.items() if isinstance(row, dict) else enumerate(row)) if c}
+        for row in M
+    ]
+
+
+def reachable_states(S, start=0):
+    """ Return the set of states that can be reached from start in sparse matrix S. """
+    seen = {start}
+    stack = [start]
+    while stack:
+        for v in S[stack.pop()]:
+            if v not in seen:
+                seen.add(v)
+                stack.append(v)
+    return seen
+
+
+def sparse_transform(S):
+    """
+    Transform sparse matrix S into standard form.
+
+    Returns (absorbing, rows), where absorbing is the list of absorbing
+    states and rows maps each reachable transient state to its counts for
+    [Q' | R'], without self loops.
+    """
+    absorbing = [i for i, row in enumerate(S) if not row]
+
+    rows = {
+        u: {v: c for v, c in S[u].items() if v != u}
+        for u in reachable_states(S) if S[u]
+    }
+
+    return absorbing, rows
+
+
+def eliminate_state(rows, predecessors, k):
+    """
+    Eliminate transient state k from every row that leads to it.
+
+    Each updated row is divided through by the gcd of its counts, to stop
+    them growing any more than needed.
+    """
+    row_k = rows.pop(k)
+    total = sum(row_k.values())
+
+    if not total:
+        raise ValueError('State %d never reaches an absorbing state' % k)
+
+    for i in predecessors.pop(k):
+        row_i = rows[i]
+
+        # row(i) = e * row(i) + a * row(k), with the common factor removed
+        a = row_i.pop(k)
+        g = gcd(total, a)
+        e, a = total // g, a // g
+
+        if e != 1:
+            for j in row_i:
+                row_i[j] *= e
+
+        for j, c in row_k.items():
+            if j == i:
+                continue  # Drop the self loop
+            if j in row_i:
+                row_i[j] += a * c
+            else:
+                row_i[j] = a * c
+                if j in predecessors:
+                    predecessors[j].add(i)
+
+        g = reduce(gcd, row_i.values(), 0)
+        if g > 1:
+            for j in row_i:
+                row_i[j] //= g
+
+    # k no longer leads anywhere
+    for j in row_k:
+        if j in predecessors:
+            predecessors[j].discard(k)
+
+
+def make_plan(S):
+    """
+    Return the Plan for sparse matrix S.
+
+    The plan only depends on the zero pattern of S: as every count is
+    non-negative, eliminating a state fills in the same entries whatever the
+    counts are. So the order is found by eliminating states symbolically,
+    cheapest first by their number of predecessors times successors, so as
+    little as possible is filled in.
+    """
+    absorbing, rows = sparse_transform(S)
+
+    # Successor and predecessor sets for each transient state
+    successors = {u: set(row) for u, row in rows.items()}
+    predecessors = {u: set() for u in rows}
+    for u, row in successors.items():
+        for v in row:
+            if v in predecessors:
+                predecessors[v].add(u)
+
+    cost = lambda k: len(predecessors[k]) * len(successors[k])
+    heap = [(cost(k), k) for k in rows if k]
+    heapq.heapify(heap)
+
+    order = []
+    while heap:
+        c, k = heapq.heappop(heap)
+        if k not in successors:
+            continue
+        if c != cost(k):
+            heapq.heappush(heap, (cost(k), k))  # Stale, try again later
+            continue
+
+        row_k = successors.pop(k)
+        for i in predecessors.pop(k):
+            row_i = successors[i]
+            row_i.discard(k)
+            for j in row_k:
+                if j != i and j not in row_i:
+                    row_i.add(j)
+                    if j in predecessors:
+                        predecessors[j].add(i)
+        for j in row_k:
+            if j in predecessors:
+                predecessors[j].discard(k)
+
+        order.append(k)
+
+    return Plan(absorbing, sorted(rows), order)
+
+
+def sparse_absorption_probabilities(M, plan=None):
+    """
+    Return the absorption probabilities from state 0 for sparse matrix M.
+
+    M may be a list of lists or a list of {state: count} dicts, and the
+    result matches absorption_probabilities(M). A plan made from a matrix
+    with the same zero pattern may be given to skip making one.
+    """
+    S = sparse_matrix(M)
+
+    if plan is None:
+        plan = make_plan(S)
+
+    # Special case for starting in an absorbing state
+    if not S[0]:
+        return [int(i == 0) for i in plan.absorbing] + [1]
+
+    # Transient rows in standard form, without self loops
+    rows = {u: {v: c for v, c in S[u].items() if v != u} for u in plan.transient}
+
+    # Track which transient states lead to each transient state
+    predecessors = {u: set() for u in rows}
+    for u, row in rows.items():
+        for v in row:
+            if v in predecessors:
+                predecessors[v].add(u)
+
+    for k in plan.order:
+        eliminate_state(rows, predecessors, k)
+
+    # Row 0 now only leads to absorbing states
+    row = rows[0]
+    if not row:
+        raise ValueError('State 0 never reaches an absorbing state')
+
+    return simplify([row.get(v, 0) for v in plan.absorbing], sum(row.values()))
+
+
+def is_sparse(M, density=0.25):
+    """ Return true if M is given as dicts, or at most density of M is non-zero. """
+    if any(isinstance(row, dict) for row in M):
+        return True
+    return sum(1 for row in M for c in row if c) <= density * len(M) ** 2
+
+
+class LRUCache:
+    """ A dictionary that only keeps the most recently used maxsize items. """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.items = OrderedDict()
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def get(self, key, default=None):
+        if key not in self.items:
+            return default
+        value = self.items.pop(key)
+        self.items[key] = value  # Now the most recent
+        return value
+
+    def put(self, key, value):
+        self.items.pop(key, None)
+        self.items[key] = value
+        while len(self.items) > self.maxsize:
+            self.items.popitem(last=False)
+
+    def clear(self):
+        self.items.clear()
+
+
+def canonical_matrix(M):
+    """
+    Return matrix M as a hashable tuple of rows of (state, count) pairs.
+
+    Zeros are dropped and each row is divided by its gcd, as scaling a row
+    doesn't change its probabilities. So duplicates share the same key,
+    whether given as lists or dicts.
+    """
+    C = []
+    for row in sparse_matrix(M):
+        g = reduce(gcd, row.values(), 0)
+        C.append(tuple(sorted((j, c // g) for j, c in row.items())))
+    return tuple(C)
+
+
+def zero_pattern(C):
+    """ Return the zero pattern of canonical matrix C. """
+    return tuple(tuple(j for j, c in row) for row in C)
+
+
+def solve_group(args):
+    """
+    Solve a group of canonical matrices that share the same zero pattern.
+
+    Returns (plan, results), so the plan can be kept for the next group.
+    This is a top-level function so it can be sent to worker processes.
+    """
+    matrices, sparse, plan = args
+
+    # Only the sparse solver follows a plan
+    if not sparse:
+        return None, [
+            tuple(absorption_probabilities([
+                [dict(row).get(j, 0) for j in range(len(C))] for row in C
+            ]))
+            for C in matrices
+        ]
+
+    if plan is None:
+        plan = make_plan([dict(row) for row in matrices[0]])
+
+    return plan, [
+        tuple(sparse_absorption_probabilities([dict(row) for row in C], plan))
+        for C in matrices
+    ]
+
+
+# Results and plans shared by every call to solve_many
+results_cache = LRUCache(CACHE_SIZE)
+plans_cache = LRUCache(PLAN_CACHE_SIZE)
+
+
+def solve_many(matrices, sparse=None, processes=None, chunksize=64):
+    """
+    Return the absorption probabilities from state 0 for each matrix.
+
+    1. Canonicalize each matrix, and reuse any cached result
+    2. Group the rest by zero pattern, so each pattern is planned once
+    3. Solve each group, in a pool of processes if processes is given
+    4. Cache the results
+
+    The sparse solver is used for sparse matrices, unless sparse is given.
+    """
+    keys = [canonical_matrix(M) for M in matrices]
+
+    # Unique uncached matrices, grouped by zero pattern
+    known = {}
+    groups = OrderedDict()
+    for C in keys:
+        if C in known:
+            continue
+        result = results_cache.get(C)
+        if result is not None:
+            known[C] = result
+        else:
+            groups.setdefault(zero_pattern(C), OrderedDict())[C] = None
+
+    # Split each group into tasks, passing on any known plan
+    tasks, patterns = [], []
+    for pattern, group in groups.items():
+        group = list(group)
+        use_sparse = sparse
+        if use_sparse is None:
+            # Test the counts, as dict rows would always count as sparse
+            use_sparse = is_sparse([[c for j, c in row] for row in group[0]])
+        for j in range(0, len(group), chunksize):
+            tasks.append((group[j:j + chunksize], use_sparse, plans_cache.get((pattern, use_sparse))))
+            patterns.append((pattern, use_sparse))
+
+    if processes and len(tasks) > 1:
+        from multiprocessing import Pool
+        pool = Pool(processes)
+        try:
+            solved = pool.map(solve_group, tasks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        solved = [solve_group(task) for task in tasks]
+
+    # Keep the new plans and results
+    for (group, _, _), key, (plan, results) in zip(tasks, patterns, solved):
+        if plan is not None:
+            plans_cache.put(key, plan)
+        for C, result in zip(group, results):
+            known[C] = result
+            results_cache.put(C, result)
+
+    return [list(known[C]) for C in keys]
+
+
+def fast_probabilities(M, tolerance=TOLERANCE):
+    """
+    Return approximate absorption probabilities from state 0 for matrix M.
+
+    Uses NumPy (LAPACK) to solve (I - Q)^T . y = e0 in floating point, and
+    returns the list of probabilities y.R for each absorbing state.
+
+    One step of iterative refinement is used to check the solution: the
+    size of the correction estimates its error, which grows with the
+    condition of (I - Q). A ValueError is raised if it is over tolerance,
+    or the probabilities don't add up, rather than return a bad answer.
+    """
+    if np is None:
+        raise ImportError('NumPy is required for the fast solver')
+
+    # Dense float matrix, from either lists or dicts
+    if any(isinstance(row, dict) for row in M):
+        A = np.zeros((len(M), len(M)))
+        for j, row in enumerate(sparse_matrix(M)):
+            A[j, list(row)] = list(row.values())
+    else:
+        A = np.array(M, dtype=float)
+
+    # Absorbing and transient states
+    sums = A.sum(axis=1)
+    absorbing = np.flatnonzero(sums == 0)
+    transient = np.flatnonzero(sums)
+
+    # Special case for starting in an absorbing state
+    if not sums[0]:
+        return [float(i == 0) for i in absorbing]
+
+    # Get R and Q, as probabilities
+    P = A[transient] / sums[transient, None]
+    R = P[:, absorbing]
+    Q = P[:, transient]
+
+    # Solve (I - Q)^T . y = e0 (state 0 is always the first transient state)
+    N = (np.eye(len(transient)) - Q).T
+    e0 = np.zeros(len(transient))
+    e0[0] = 1
+
+    try:
+        y = np.linalg.solve(N, e0)
+        correction = np.linalg.solve(N, e0 - N.dot(y))
+    except np.linalg.LinAlgError:
+        raise ValueError('Matrix is singular')
+
+    y += correction
+    probabilities = y.dot(R)
+
+    # Check the estimated error, and that the probabilities add up
+    error = np.abs(correction).max() / max(np.abs(y).max(), 1.0)
+    if (
+        not np.isfinite(probabilities).all() or
+        not error <= tolerance or
+        abs(probabilities.sum() - 1) > tolerance or
+        probabilities.min() < -tolerance
+    ):
+        raise ValueError('Fast solution is not accurate enough')
+
+    return probabilities.clip(0, 1).tolist()
+
+
+def solution(M, sparse=None, mode='exact'):
+    """
+    Return the absorption probabilities from state 0 for matrix M.
+
+    Modes:
+        exact: Return the exact numerators, followed by their common
+               denominator
+        fast:  Return approximate probabilities from the NumPy solver, as
+               floats, raising a ValueError if they aren't accurate enough
+        auto:  Return probabilities as floats, from the NumPy solver when it
+               is available and accurate enough, otherwise the exact solver
+
+    The sparse solver is used for sparse matrices, unless sparse is given.
+    """
+    if mode == 'fast':
+        return fast_probabilities(M)
 
-    # Calculate F x R
-    FR = multiply_matrices(F, R)
+    if mode == 'auto':
+        if np is not None:
+            try:
+                return fast_probabilities(M)
+            except ValueError:
+                pass  # Fall back to the exact solver
 
-    # Caclulate probabilities as fractions
-    probabilities = [Fraction(c).limit_denominator() for c in FR[0]]
+        result = solve_many([M], sparse=sparse)[0]
+        return [float(Fraction(c, result[-1])) for c in result[:-1]]
 
-    # Calculate lowest common denominator
-    lcd = reduce(lcm, [fraction.denominator for fraction in probabilities])
+    if mode != 'exact':
+        raise ValueError('Unknown mode: %r' % mode)
 
-    # Return the list of numerators and common denominator
-    return list(map(lambda x: int(x.numerator * lcd / x.denominator), probabilities)) + [int(lcd)]
+    return solve_many([M], sparse=sparse)[0]
@@ -131,3 +131,35 @@ assert (
         [0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
     ]) == [1, 1, 1, 2, 5]
 )
+
+# Symmetric random walk across 40 transient states, absorbed at either end
+walk = [[0] * 42 for j in range(42)]
+for j in range(40):
+    walk[j][j - 1 if j else 40] = 1
+    walk[j][j + 1 if j < 39 else 41] = 1
+
+assert (
+    answer(walk) == [40, 1, 41]
+)
+
+# The same walk across 1000 transient states, given as sparse rows
+walk = [{j - 1 if j else 1000: 1, j + 1 if j < 999 else 1001: 1} for j in range(1000)] + [{}, {}]
+
+assert (
+    answer(walk) == [1000, 1, 1001]
+)
+
+# Approximate probabilities, from NumPy when it's available
+assert (
+    solution.solution([[0, 1, 1], [0, 0, 0], [0, 0, 0]], mode='auto') == [0.5, 0.5]
+)
+
+# A dense chain goes through the Bareiss solver, and agrees with the sparse one
+dense = [[(i * j) % 7 + 1 for i in range(12)] for j in range(8)] + [[0] * 12 for j in range(4)]
+assert not solution.is_sparse(dense)
+solution.results_cache.clear()
+exact = answer(dense)
+solution.results_cache.clear()
+assert (
+    solution.solution(dense, sparse=True) == exact
+)
@@ -0,0 +1,63 @@
+"""
+Benchmark the NAF count and the run-length engine against the
+one-operation-at-a-time loop.
+
+All are timed on random odd numbers of each bit length, passed as ints
+(decimal strings of 10^5 bits are past Python 3.11's default int() digit
+limit, which parse() works around but would dominate the timing). The
+loop is quadratic in the bit length, so it is only timed up to LOOP_LIMIT
+bits.
+
+Usage:
+    python benchmark.py [bits ...]
+"""
+
+from __future__ import print_function
+
+import random
+import sys
+import timeit
+
+import solution
+
+# Bit lengths to benchmark by default
+BITS = [10, 100, 1000, 10000, 100000]
+
+# Longest input, in bits, to run the loop on
+LOOP_LIMIT = 100000
+
+
+def best_time(func, n, repeat=3):
+    """ Return the best time, in seconds, for a single call of func(n). """
+    timer = timeit.Timer(lambda: func(n))
+    number = 1
+    while timer.timeit(number) < 0.2 and number < 1000:
+        number *= 10
+    return min(timer.repeat(repeat, number)) / number
+
+
+def main(bit_lengths):
+    random.seed(0)
+
+    print('%7s %12s %12s %12s %9s %8s' % (
+        'bits', 'count (s)', 'runs (s)', 'loop (s)', 'speedup', 'match'))
+
+    for bits in bit_lengths:
+        n = random.getrandbits(bits) | (1 << (bits - 1)) | 1
+
+        count = best_time(solution.count_operations, n)
+        runs = best_time(solution.run_operations, n)
+        results = set([solution.count_operations(n), solution.run_operations(n)])
+
+        if bits <= LOOP_LIMIT:
+            loop = best_time(solution.step_operations, n)
+            times = '%12.6f %9.1f' % (loop, loop / runs)
+            results.add(solution.step_operations(n))
+        else:
+            times = '%12s %9s' % ('-', '-')
+
+        print('%7d %12.6f %12.6f %s %8s' % (bits, count, runs, times, len(results) == 1))
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or BITS)
@@ -1,4 +1,41 @@
-def solution(n):
+import re
+from array import array
+from collections import deque
+from itertools import islice
+
+# Runs of equal bits
+RUNS = re.compile('0+|1+')
+
+# Runs of operations in a trace
+TRACE = re.compile('([-+/])([0-9]*)')
+
+# Longest decimal string int() is trusted to parse in one go (Python 3.11+
+# refuses more than 4300 digits by default)
+DIGITS_LIMIT = 4000
+
+# Number of values in each chunk sent to a worker process
+CHUNK_SIZE = 4096
+
+
+def parse(n):
+    """
+    Return n as an int, parsing long decimal strings in chunks so they
+    don't hit the int() digit limit.
+    """
+    if not isinstance(n, str) or len(n) <= DIGITS_LIMIT:
+        return int(n)
+
+    n = n.strip()
+    sign, digits = (-1, n[1:]) if n[:1] == '-' else (1, n.lstrip('+'))
+
+    value = 0
+    for i in range(0, len(digits), DIGITS_LIMIT):
+        chunk = digits[i:i + DIGITS_LIMIT]
+        value = value * 10 ** len(chunk) + int(chunk)
+    return sign * value
+
+
+def step_operations(n):
     """
     Calculate the minimum number of operations required
     to transform the number of pellets to 1.
@@ -24,7 +61,7 @@ def solution(n):
 
     Note: Recursion struggles on excesively large numbers.
     """
-    n = int(n)
+    n = parse(n)
 
     operations = 0
 
@@ -39,3 +76,302 @@ def solution(n):
         operations += 1
 
     return operations
+
+
+def operation_runs(n):
+    """
+    Yield the operations step_operations() would make, as (operation,
+    count) pairs, a whole run of bits at a time rather than one operation
+    at a time. Operations are '+' (add), '-' (subtract) or '/' (halve).
+
+    Working up from the lowest bit, with the runs of 1s and 0s above:
+    1) A run of z 0s is halved away in z operations
+    2) A single 1 is subtracted, then halved away along with the z 0s
+       above it, in 2 + z operations
+    3) A run of r 1s is added to, which halves away in 1 + r operations
+       and carries a 1 into the 0s above; if there was only one 0 that
+       joins the run of 1s above, otherwise it's a new single 1
+    4) The top run finishes the job, in 0 operations if it is a single 1
+       (n is 1), 2 if it is 11 (3 is the exception) or 1 + r otherwise
+
+    So the operations depend only on the run lengths, found with a single
+    pass over bin(n), and no intermediate values are needed.
+    """
+    n = parse(n)
+    if n <= 1:
+        return
+
+    # Lengths of each run of bits, lowest first
+    bits = bin(n)[:1:-1]
+    lengths = list(map(len, RUNS.findall(bits)))
+
+    i = 0
+
+    # Halve away any trailing 0s
+    if bits[0] == '0':
+        yield '/', lengths[0]
+        i = 1
+
+    # lengths[i] is a run of 1s, with the run of 0s above it next
+    ones = lengths[i]
+    while i + 1 < len(lengths):
+        zeros = lengths[i + 1]
+
+        if ones == 1:
+            # Subtract, then halve away the bit and the 0s above
+            yield '-', 1
+            yield '/', 1 + zeros
+            i += 2
+            ones = lengths[i]
+        elif zeros == 1:
+            # Add, halve away the run, and carry into the run above
+            yield '+', 1
+            yield '/', ones
+            i += 2
+            ones = lengths[i] + 1
+        else:
+            # Add, halve away the run, and carry into a new single 1
+            yield '+', 1
+            yield '/', ones
+            lengths[i + 1] = zeros - 1
+            ones = 1
+
+    # The top run
+    if ones == 2:
+        yield '-', 1
+        yield '/', 1
+    elif ones > 2:
+        yield '+', 1
+        yield '/', ones
+
+
+def run_operations(n):
+    """
+    Calculate the same number of operations as step_operations(), a whole
+    run of bits at a time (see operation_runs()).
+    """
+    return sum(count for operation, count in operation_runs(n))
+
+
+def count_operations(n):
+    """
+    Calculate the same number of operations as step_operations(), with a
+    handful of whole-number operations and no loop.
+
+    Adding to ...11 and subtracting from ...01 is exactly the non-adjacent
+    form (NAF) of n, where each digit is -1, 0 or 1 and no two adjacent
+    digits are non-zero. Each non-zero digit below the top one is an add or
+    subtract, and each digit above the lowest is a halving. The NAF digits
+    are non-zero where n / 2 and 3n / 2 differ, so:
+
+        operations = (digits - 1) + (non-zero digits - 1)
+
+    less one if the NAF ends in 10(-1), as 3 is subtracted from (3, 2, 1)
+    rather than added to (3, 4, 2, 1).
+    """
+    n = parse(n)
+    if n <= 1:
+        return 0
+
+    half = n >> 1
+    three_halves = n + half
+    digits = half ^ three_halves
+
+    length = digits.bit_length()
+    operations = (length - 1) + (bin(digits).count('1') - 1)
+
+    # Finishing with 3 (a -1 digit two below the top)
+    if length >= 3 and (half & digits) >> (length - 3) & 1:
+        operations -= 1
+
+    return operations
+
+
+def encode_trace(runs):
+    """
+    Return (operation, count) pairs as a run-length encoded bytestring, with
+    adjacent runs of the same operation merged, and counts of 1 left out.
+
+        [('+', 1), ('/', 4), ('-', 1), ('/', 2)] -> b'+/4-/2'
+    """
+    pieces = []
+    last, total = None, 0
+
+    for operation, count in runs:
+        if operation == last:
+            total += count
+            continue
+        if last is not None:
+            pieces.append(last if total == 1 else '%s%d' % (last, total))
+        last, total = operation, count
+
+    if last is not None:
+        pieces.append(last if total == 1 else '%s%d' % (last, total))
+
+    return ''.join(pieces).encode('ascii')
+
+
+def decode_trace(trace):
+    """ Return a run-length encoded trace as a list of (operation, count) pairs. """
+    if not isinstance(trace, str):
+        trace = trace.decode('ascii')
+    return [(operation, int(count or 1)) for operation, count in TRACE.findall(trace)]
+
+
+def trace(n):
+    """
+    Return the operations step_operations() would make as a run-length
+    encoded bytestring, such as b'+/4' for 15 (add, halve 4 times).
+    """
+    return encode_trace(operation_runs(n))
+
+
+def replay(n, trace):
+    """
+    Return the number of pellets left after making the operations in a
+    trace, to audit it (this one does build every intermediate value).
+    """
+    n = parse(n)
+    for operation, count in decode_trace(trace):
+        if operation == '+':
+            n += count
+        elif operation == '-':
+            n -= count
+        else:
+            n >>= count
+    return n
+
+
+def fewest_operations(limit):
+    """
+    Return the fewest operations to reach 1 from every n up to limit, as an
+    array indexed by n, by an exhaustive search.
+
+    Searches backwards from 1 breadth first (doubling, adding and
+    subtracting), over every route that stays within 2 * limit + 2 pellets,
+    so each n is reached by its shortest route first.
+    """
+    cap = 2 * limit + 2
+    fewest = array('i', [-1]) * (cap + 1)
+    fewest[1] = 0
+
+    frontier, depth = [1], 0
+    while frontier:
+        depth += 1
+        next_frontier = []
+        for n in frontier:
+            for m in (n << 1, n + 1, n - 1):
+                if 1 <= m <= cap and fewest[m] < 0:
+                    fewest[m] = depth
+                    next_frontier.append(m)
+        frontier = next_frontier
+
+    return fewest[:limit + 1]
+
+
+def check_greedy(limit):
+    """
+    Cross-check the greedy rule, the run-length engine, the NAF count and
+    the traces against the exhaustive search, for every n from 1 up to
+    limit. Returns a list of (n, greedy, fewest) for any n that disagree.
+    """
+    fewest = fewest_operations(limit)
+    mismatches = []
+
+    for n in range(1, limit + 1):
+        greedy = step_operations(n)
+        path = trace(n)
+        agree = (
+            greedy == fewest[n] == run_operations(n) == count_operations(n) and
+            sum(count for operation, count in decode_trace(path)) == greedy and
+            replay(n, path) == 1
+        )
+        if not agree:
+            mismatches.append((n, greedy, fewest[n]))
+
+    return mismatches
+
+
+def solution(n):
+    """
+    Calculate the minimum number of operations required
+    to transform the number of pellets to 1.
+
+    See count_operations(), which counts the operations of step_operations()
+    without a loop.
+    """
+    return count_operations(n)
+
+
+def solve_chunk(chunk):
+    """ Return the operations for each of a chunk of values. """
+    return [count_operations(n) for n in chunk]
+
+
+def chunks(values, size):
+    """ Split a stream of values into lists of up to size values. """
+    values = iter(values)
+    while True:
+        chunk = list(islice(values, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def ordered_results(pool, tasks, window):
+    """
+    Yield the results of solve_chunk() for each task, in order, keeping at
+    most window tasks in flight in the pool.
+    """
+    pending = deque()
+    for task in tasks:
+        pending.append(pool.apply_async(solve_chunk, (task,)))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+
+    while pending:
+        yield pending.popleft().get()
+
+
+def solve_batch(values, processes=None, chunksize=CHUNK_SIZE, window=None, report=None):
+    """
+    Yield the operations for each of a stream of values, in order.
+
+    Values can be ints or decimal strings, so a file of one value per line
+    can be passed straight in. They are solved in chunks of chunksize, in a
+    pool of processes if processes is given, with at most window chunks
+    (by default twice the processes) in flight, so memory stays bounded
+    however long the stream is. If report is given (a file, such as
+    sys.stderr), the throughput is written to it once the stream is done.
+    """
+    # The clock is only read for a report (time isn't allowed in the sandbox)
+    if report is not None:
+        import time
+        start = time.time()
+    count = 0
+
+    pool = None
+    if processes:
+        from multiprocessing import Pool
+        pool = Pool(processes)
+        window = window or 2 * processes
+
+    try:
+        if pool:
+            results = ordered_results(pool, chunks(values, chunksize), window)
+        else:
+            results = (solve_chunk(chunk) for chunk in chunks(values, chunksize))
+
+        for result in results:
+            count += len(result)
+            for operations in result:
+                yield operations
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    if report is not None:
+        elapsed = time.time() - start
+        report.write('%d values in %.3fs (%.0f values/s)\n' % (
+            count, elapsed, count / elapsed if elapsed else 0.0))
@@ -1,6 +1,29 @@
 import operator
+import os
+import struct
 from functools import reduce
 
+try:
+    import numpy as np
+except ImportError:
+    np = None  # Fall back to Python ints throughout
+
+# Largest ID the uint64 arrays can hold
+UINT64_MAX = (1 << 64) - 1
+
+# Number of rows to build at once with NumPy
+ROW_BATCH = 1 << 20
+
+# Longest queue solve_many() builds the rows of, rather than using xor_rows()
+ROW_LIMIT = 256
+
+# Each interval in a binary interval file: (first, last) as little-endian uint64
+INTERVAL_FORMAT = '<2Q'
+INTERVAL_SIZE = struct.calcsize(INTERVAL_FORMAT)
+
+# Number of intervals to read from a file at once
+INTERVAL_BATCH = 1 << 16
+
 
 def f(n):
     """
@@ -30,8 +53,367 @@ def xor_range(a, b):
     return f(b) ^ f(a - 1)
 
 
-def solution(start, length):
+def floor_sum(n, m, a, b):
+    """
+    Return the sum of (a * i + b) // m for i from 0 to n - 1, for
+    non-negative a and b, in O(log m) steps.
+
+    Whole multiples of m in a and b are summed directly, then the rest is
+    counted as lattice points under the line, swapping the axes (so m and
+    a swap over, like Euclid's algorithm).
+    """
+    total = 0
+    while True:
+        if a >= m:
+            total += (n - 1) * n // 2 * (a // m)
+            a %= m
+        if b >= m:
+            total += n * (b // m)
+            b %= m
+
+        y_max = a * n + b
+        if y_max < m:
+            return total
+
+        n, b = divmod(y_max, m)
+        m, a = a, m
+
+
+def xor_progression(first, step, count):
+    """
+    Return the XOR of count numbers, first, first + step, first + 2 * step,
+    and so on (all non-negative).
+
+    Bit k of a number x is (x >> k) - 2 * (x >> (k + 1)), so bit k of the
+    XOR is the parity of the sum of (first + step * i) >> k, which is a
+    floor_sum(). That's O(log) per bit, so O(log^2) overall.
+    """
+    if count <= 0:
+        return 0
+
+    last = first + step * (count - 1)
+    result = 0
+    for k in range(max(first, last).bit_length()):
+        if floor_sum(count, 1 << k, step, first) & 1:
+            result |= 1 << k
+    return result
+
+
+def xor_f_progression(first, step, count):
+    """
+    Return the XOR of f(n) for count numbers n, first, first + step,
+    first + 2 * step, and so on (all at least -1). A negative step is just
+    the same numbers in reverse.
+
+    f(n) only depends on n % 4, which repeats every 4 terms, so each of the
+    4 classes of terms is itself a progression (with step * 4) with the
+    same n % 4:
+
+        0: f(n) = n      XOR the progression
+        1: f(n) = 1      1 if there are an odd number of terms
+        2: f(n) = n + 1  XOR the progression, plus one
+        3: f(n) = 0      nothing
+    """
+    if step < 0 and count > 0:
+        first, step = first + step * (count - 1), -step
+
+    result = 0
+    for r in range(min(count, 4)):
+        n = first + step * r
+        terms = (count - r + 3) // 4
+        modulus = n & 3
+
+        if modulus == 0:
+            result ^= xor_progression(n, step * 4, terms)
+        elif modulus == 1:
+            result ^= terms & 1
+        elif modulus == 2:
+            result ^= xor_progression(n + 1, step * 4, terms)
+
+    return result
+
+
+def xor_rows(start, length, first_row=0, last_row=None):
+    """
+    Return the XOR checksum of the rows first_row up to (not including)
+    last_row, by default all length of them, without visiting each row.
+
+    Row l runs from start + l * length to start + l * length + length - l - 1,
+    so the row ends, and the numbers before each row's start, are both
+    progressions:
+
+        XOR of rows = XOR of f(end) ^ XOR of f(start - 1)
+    """
+    if last_row is None:
+        last_row = length
+    rows = last_row - first_row
+
+    ends = xor_f_progression(start + length - 1 + first_row * (length - 1), length - 1, rows)
+    befores = xor_f_progression(start - 1 + first_row * length, length, rows)
+    return ends ^ befores
+
+
+def stream_rows(start, length):
+    """
+    Return the XOR checksum by folding each row's xor_range() in turn, one
+    row at a time, without building a list of them. O(length), so mainly
+    useful to check xor_rows().
+    """
     return reduce(
         operator.xor,
-        [xor_range(start + (l * length), start + (l * length) + length - l - 1) for l in range(length)]
+        (xor_range(start + (l * length), start + (l * length) + length - l - 1) for l in range(length)),
+        0
     )
+
+
+def xor_progression_rows(first, stride, width, change, count):
+    """
+    Return the XOR checksum of count rows, where row r has the
+    width + r * change IDs from first + r * stride, in O(log^2) whatever
+    the number of rows. Rows left with no IDs are empty, so the pattern
+    can shrink to nothing.
+
+    The checkpoint is solution(start, length) ==
+    xor_progression_rows(start, length, length, -1, length), and as with
+    xor_rows(), the row ends and the numbers before each row's start are
+    progressions.
+    """
+    # Only rows r with width + r * change >= 1 have any IDs, which is a
+    # single range of rows
+    lo, hi = 0, count
+    if change < 0:
+        hi = min(hi, (width - 1) // -change + 1 if width >= 1 else 0)
+    elif change > 0:
+        lo = max(lo, -((width - 1) // change))
+    elif width < 1:
+        return 0
+
+    rows = hi - lo
+    if rows <= 0:
+        return 0
+
+    ends = xor_f_progression(first + width - 1 + lo * (stride + change), stride + change, rows)
+    befores = xor_f_progression(first - 1 + lo * stride, stride, rows)
+    return ends ^ befores
+
+
+def xor_intervals(intervals):
+    """
+    Return the XOR checksum of an explicit list of (first, last) intervals
+    of IDs (inclusive, so (first, first - 1) is empty), in O(intervals).
+    """
+    return reduce(operator.xor, (xor_range(first, last) for first, last in intervals), 0)
+
+
+def xor_interval_buffer(buffer, chunksize=INTERVAL_BATCH):
+    """
+    Return the XOR checksum of the intervals packed in a buffer, as in
+    xor_interval_file(), reading chunksize intervals at a time.
+    """
+    count = len(buffer) // INTERVAL_SIZE
+
+    if np is not None:
+        intervals = np.frombuffer(buffer, dtype='<u8', count=2 * count).reshape(-1, 2)
+        result = 0
+        for i in range(0, count, chunksize):
+            block = intervals[i:i + chunksize]
+            result ^= int(np.bitwise_xor.reduce(xor_range_array(block[:, 0], block[:, 1])))
+        return result
+
+    result = 0
+    for i in range(0, count, chunksize):
+        n = min(chunksize, count - i)
+        values = struct.unpack_from('<%dQ' % (2 * n), buffer, i * INTERVAL_SIZE)
+        result ^= xor_intervals(zip(values[::2], values[1::2]))
+    return result
+
+
+def xor_interval_file(path, chunksize=INTERVAL_BATCH):
+    """
+    Return the XOR checksum of the intervals in a binary file, each a
+    (first, last) pair of little-endian uint64 (see write_intervals()).
+
+    The file is memory-mapped and read chunksize intervals at a time, so
+    it is never loaded in full.
+    """
+    import mmap
+
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size % INTERVAL_SIZE:
+            raise ValueError('interval file is not a whole number of intervals')
+        if not size:
+            return 0
+
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return xor_interval_buffer(buffer, chunksize)
+        finally:
+            buffer.close()
+
+
+def write_intervals(path, intervals):
+    """ Write (first, last) intervals to a binary file for xor_interval_file(). """
+    with open(path, 'wb') as f:
+        for first, last in intervals:
+            f.write(struct.pack(INTERVAL_FORMAT, first, last))
+
+
+def fits(start, length):
+    """ Return true if every ID in the queue fits in a uint64. """
+    return np is not None and start >= 0 and start + length * length <= UINT64_MAX
+
+
+def f_array(n):
+    """ Return f(n) for each of a uint64 array of numbers. """
+    n = np.asarray(n, dtype=np.uint64)
+    modulus = n & np.uint64(3)
+
+    return np.where(modulus == 0, n, np.where(
+        modulus == 1, np.uint64(1), np.where(
+            modulus == 2, n + np.uint64(1), np.uint64(0))))
+
+
+def xor_range_array(a, b):
+    """
+    Return the XOR of numbers from A to B, for each of a pair of uint64
+    arrays (A - 1 wraps around for 0, which f() treats the same as -1).
+    """
+    return f_array(b) ^ f_array(np.asarray(a, dtype=np.uint64) - np.uint64(1))
+
+
+def rows_checksum(start, length, first_row=0, last_row=None):
+    """
+    Return the XOR checksum of the rows first_row up to (not including)
+    last_row, building the rows ROW_BATCH at a time as uint64 arrays and
+    XOR-reducing them. Queues with IDs too large for a uint64 (or without
+    NumPy) fall back to xor_rows() on Python ints.
+    """
+    if last_row is None:
+        last_row = length
+
+    if not fits(start, length):
+        return xor_rows(start, length, first_row, last_row)
+
+    start, width = np.uint64(start), np.uint64(length)
+    result = 0
+
+    for first in range(first_row, last_row, ROW_BATCH):
+        l = np.arange(first, min(first + ROW_BATCH, last_row), dtype=np.uint64)
+        a = start + l * width
+        b = a + (width - np.uint64(1) - l)
+        result ^= int(np.bitwise_xor.reduce(xor_range_array(a, b)))
+
+    return result
+
+
+def rows_part(args):
+    """
+    Return xor_rows() for a single (start, length, first_row, last_row)
+    tuple, so it can be mapped over worker processes.
+    """
+    return xor_rows(*args)
+
+
+def parallel_checksum(start, length, processes, parts=None):
+    """
+    Return the XOR checksum, splitting the rows into parts (by default one
+    per process) solved by xor_rows() in a pool of processes. XOR is
+    associative, so the partial checksums are just XORed together.
+
+    Each part is already O(log^2 length), so this is no faster than
+    xor_rows() for a single queue; the pool only pays off across the many
+    queries of solve_many().
+    """
+    parts = parts or processes
+    bounds = [length * i // parts for i in range(parts + 1)]
+    tasks = [(start, length, bounds[i], bounds[i + 1]) for i in range(parts)]
+
+    from multiprocessing import Pool
+    pool = Pool(processes)
+    try:
+        return reduce(operator.xor, pool.map(rows_part, tasks), 0)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def solve_query(query):
+    """ Return xor_rows() for a single (start, length) query. """
+    return xor_rows(*query)
+
+
+def short_checksums(queries):
+    """
+    Return the checksums of a list of short (start, length) queries, by
+    building every row of every query as one set of uint64 arrays and
+    XOR-reducing each query's rows with np.bitwise_xor.reduceat.
+    """
+    starts = np.array([start for start, length in queries], dtype=np.uint64)
+    lengths = np.array([length for start, length in queries], dtype=np.uint64)
+
+    # Offset of each query's first row, and which query and row each row is
+    offsets = np.cumsum(lengths) - lengths
+    query = np.repeat(np.arange(len(queries)), lengths.astype(np.intp))
+    l = np.arange(len(query), dtype=np.uint64) - offsets[query]
+
+    width = lengths[query]
+    a = starts[query] + l * width
+    b = a + (width - np.uint64(1) - l)
+
+    return np.bitwise_xor.reduceat(xor_range_array(a, b), offsets.astype(np.intp)).tolist()
+
+
+def solve_many(queries, processes=None, chunksize=256):
+    """
+    Return the checksum for each of a list of (start, length) queries.
+
+    Short queues that fit in a uint64 are solved together with NumPy, about
+    ROW_BATCH rows at a time. The rest use xor_rows() on Python ints, in a
+    pool of processes if processes is given.
+    """
+    queries = [(start, length) for start, length in queries]
+    results = [0] * len(queries)
+
+    short = [
+        i for i, (start, length) in enumerate(queries)
+        if 1 <= length <= ROW_LIMIT and fits(start, length)
+    ]
+    rest = sorted(set(range(len(queries))) - set(short))
+
+    # Batches of short queries, of about ROW_BATCH rows each
+    batch, rows = [], 0
+    for i in short + [None]:
+        if i is not None:
+            batch.append(i)
+            rows += queries[i][1]
+        if batch and (i is None or rows >= ROW_BATCH):
+            checksums = short_checksums([queries[j] for j in batch])
+            for j, checksum in zip(batch, checksums):
+                results[j] = checksum
+            batch, rows = [], 0
+
+    pool = None
+    if processes and rest:
+        from multiprocessing import Pool
+        pool = Pool(processes)
+
+    try:
+        tasks = [queries[i] for i in rest]
+        if pool:
+            checksums = pool.map(solve_query, tasks, chunksize)
+        else:
+            checksums = [solve_query(task) for task in tasks]
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    for i, checksum in zip(rest, checksums):
+        results[i] = checksum
+
+    return results
+
+
+def solution(start, length):
+    return xor_rows(start, length)
@@ -88,9 +88,121 @@
     Another benefit of this alternate solution, is that only mirrored positions for
     yourself and the guard need checking, which greatly reduces the number of
     calculations and iterations needed.
+
+    Bearings
+    ========
+
+    Every mirrored position is on the integer lattice, so rather than a rounded
+    angle, the bearing of a shot at (dx, dy) is the smallest integer vector in
+    the same direction:
+
+        (dx / gcd(dx, dy), dy / gcd(dx, dy))
+
+    Distances are compared squared, so no floats are needed at all, and two
+    positions only share a bearing if they are exactly in line.
+
+    With NumPy, the mirrored positions for a whole batch of rooms are built at
+    once as arrays. Sorting them by bearing, then distance, leaves the nearest
+    hit in each direction first, so a single unique pass finds them all.
+
+    Quadrants
+    =========
+
+    Only rooms that overlap the circle of radius distance around you can hold
+    a hit, so for each row of rooms the range of rooms to check is found from
+    the nearest point of the row:
+
+        dy = distance from you to the row
+        dx = isqrt(distance^2 - dy^2)
+
+        rooms from (you.x - dx) // x_dim to (you.x + dx) // x_dim
+
+    Shots in different quadrants can never share a bearing, so each quadrant
+    is solved on its own (and can be solved in parallel), and the hits just
+    added up. Each quadrant is half-open, so shots along an axis are only
+    counted once:
+
+        0: dx > 0, dy >= 0     1: dx <= 0, dy > 0
+        2: dx < 0, dy <= 0     3: dx >= 0, dy < 0
+
+    The quadrant only needs the rooms on its side of your own room (which is
+    shared with its neighbours), which skips about 1 - pi/4 of the grid.
+
+    Bands
+    =====
+
+    For long distances, each quadrant's rows are split further into bands,
+    which can be solved by separate worker processes. Each band returns a
+    table of the nearest hit for each bearing it saw, and the tables are
+    merged in band order, keeping the nearest hit (with you before the
+    guard). As this is a strict ordering, the result doesn't depend on how
+    the rows were split.
+
+    Firing solutions
+    ================
+
+    firing_solutions() streams each shot (bearing, path length and the room
+    it was aimed into) nearest first. The circle is searched in rings of
+    doubling radius; a hit is the nearest on its bearing if nothing in its
+    own ring is nearer and its bearing wasn't seen in an inner ring, so
+    each ring can be sorted and yielded as soon as it is solved. Each ring
+    only mirrors the rooms that reach past its inner circle, so together
+    the rings cover the circle about once.
+
+    solution() counts the same rings without sorting them or building each
+    Shot (count_shots()), and test.py checks that against count_directions().
+
+    Rooms
+    =====
+
+    GuardFightRoom answers many queries in the same room. The offset and
+    parity of each mirrored room are kept as arrays, so a query only adds
+    its positions to them, then each quadrant's rows are solved with the
+    same pruning as count_directions().
+    The nearest hit in each direction doesn't depend on the distance, so
+    queries with the same positions are solved once at the longest
+    distance, and each count is just how many guard hits are in range.
 """
 
 import math
+from bisect import bisect_right
+from collections import namedtuple
+
+try:
+    from math import gcd
+except ImportError:
+    from fractions import gcd
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # Fall back to the pure Python engine
+
+# Number of mirrored positions to handle at once with NumPy
+BATCH_SIZE = 1 << 20
+
+# Number of rooms in each band of rows sent to a worker process
+BAND_SIZE = 1 << 22
+
+# Kinds of hit, ordered so you block the guard at the same distance
+YOU, GUARD = 0, 1
+
+# Sides of your room that each quadrant's rooms are on
+QUADRANTS = ((1, 1), (-1, 1), (-1, -1), (1, -1))
+
+# A direction that hits the guard, the length of its path, and the room
+# (x, y) of the guard's mirrored position it was aimed at
+Shot = namedtuple('Shot', ['bearing', 'distance', 'room'])
+
+
+def isqrt(n):
+    """ Return the integer square root of n. """
+    r = int(math.sqrt(n))
+    while r * r > n:
+        r -= 1
+    while (r + 1) * (r + 1) <= n:
+        r += 1
+    return r
 
 
 class Vector2:
@@ -149,8 +261,9 @@ class Vector2:
     magnitude = __abs__
 
     def direction(self):
-        # TODO: Fix to use proper bearing/heading
-        return round(math.atan2(self.y, self.x), 7)
+        """ Return the bearing as the smallest integer vector in the same direction. """
+        g = gcd(abs(self.x), abs(self.y)) or 1
+        return self.x // g, self.y // g
 
 
 class Point2(Vector2):
@@ -159,7 +272,510 @@ class Point2(Vector2):
         return (other - self).magnitude()
 
 
-def solution(dimensions, your_position, guard_position, distance):
+def mirror(position, dim, x):
+    """
+    Return the mirrored coordinate of a position along one axis, in room x.
+    Rooms with an odd index are reflected.
+    """
+    return x * dim + (position if x & 1 == 0 else dim - position)
+
+
+def in_quadrant(quadrant, dx, dy):
+    """ Return true if (dx, dy) is in a quadrant, for ints or arrays. """
+    if quadrant == 0:
+        return (dx > 0) & (dy >= 0)
+    if quadrant == 1:
+        return (dx <= 0) & (dy > 0)
+    if quadrant == 2:
+        return (dx < 0) & (dy <= 0)
+    return (dx >= 0) & (dy < 0)
+
+
+def quadrant_rows(dimensions, you, distance, quadrant, inner=0):
+    """
+    Return a list of (y, first x, last x) for each row of rooms in a quadrant,
+    only covering the rooms that overlap the circle around you. If inner is
+    given, rooms that lie entirely within inner of you are skipped, which
+    can split a row in two.
+    """
+    x_dim, y_dim = dimensions
+    x_side, y_side = QUADRANTS[quadrant]
+
+    rows = []
+    y = 0
+    while True:
+        # Distance from you to the nearest point of the row
+        dy = max(0, y * y_dim - you[1], you[1] - (y + 1) * y_dim)
+        if dy > distance:
+            break
+
+        # Range of rooms overlapping the circle, on the quadrant's side
+        dx = isqrt(distance * distance - dy * dy)
+        first = (you[0] - dx) // x_dim
+        last = (you[0] + dx) // x_dim
+        if x_side > 0:
+            first = max(first, 0)
+        else:
+            last = min(last, 0)
+
+        # Range of rooms inside the inner circle, from the furthest point
+        # of the row
+        far = max(abs(y * y_dim - you[1]), abs((y + 1) * y_dim - you[1]))
+        if far <= inner:
+            dx = isqrt(inner * inner - far * far)
+            inside_first = -((dx - you[0]) // x_dim)
+            inside_last = (you[0] + dx) // x_dim - 1
+        else:
+            inside_first, inside_last = 0, -1
+
+        if inside_first > inside_last:
+            rows.append((y, first, last))
+        else:
+            if first < inside_first:
+                rows.append((y, first, min(last, inside_first - 1)))
+            if last > inside_last:
+                rows.append((y, max(first, inside_last + 1), last))
+
+        y += y_side
+
+    return rows
+
+
+def python_hits(dimensions, you, guard, distance, quadrant, rows=None, inner=0):
+    """
+    Return the nearest hit in each direction of a quadrant, as
+    {bearing: (distance^2, kind, x, y)}, optionally only from some of its
+    rows, or only hits further than inner.
+    """
+    x_dim, y_dim = dimensions
+    if rows is None:
+        rows = quadrant_rows(dimensions, you, distance, quadrant)
+
+    limit = distance * distance
+    inner_limit = inner * inner
+    hits = {}
+
+    for kind, (px, py) in ((YOU, you), (GUARD, guard)):
+        for y, first, last in rows:
+            dy = mirror(py, y_dim, y) - you[1]
+
+            for x in range(first, last + 1):
+                dx = mirror(px, x_dim, x) - you[0]
+
+                # Check the hit is in range and in the quadrant (which also
+                # skips your own position)
+                d = dx * dx + dy * dy
+                if d > limit or d <= inner_limit or not in_quadrant(quadrant, dx, dy):
+                    continue
+
+                # Keep the closest hit this bearing (allow for you>guard)
+                g = gcd(abs(dx), abs(dy))
+                bearing = (dx // g, dy // g)
+                best = hits.get(bearing)
+                if best is None or (d, kind) < best:
+                    hits[bearing] = (d, kind, x, y)
+
+    return hits
+
+
+def nearest(table):
+    """
+    Return a table of (bearing x, bearing y, distance^2, kind, x, y) arrays,
+    keeping only the nearest hit for each bearing, sorted by bearing.
+    """
+    bx, by, d, kind = table[:4]
+
+    # Sort by bearing, then distance, then kind, so the first of each bearing
+    # is the nearest
+    order = np.lexsort((kind, d, by, bx))
+    bx_sorted, by_sorted = bx[order], by[order]
+
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = (bx_sorted[1:] != bx_sorted[:-1]) | (by_sorted[1:] != by_sorted[:-1])
+
+    keep = order[first]
+    return tuple(column[keep] for column in table)
+
+
+def concatenate(tables):
+    """ Return a list of tables joined into one. """
+    return tuple(np.concatenate(columns) for columns in zip(*tables))
+
+
+def batches(rows, size):
+    """ Split rows of rooms into lists covering about size rooms each. """
+    batch, total = [], 0
+    for row in rows:
+        batch.append(row)
+        total += row[2] - row[1] + 1
+        if total >= size:
+            yield batch
+            batch, total = [], 0
+    if batch:
+        yield batch
+
+
+def mirrored_axis(position, dim, first, last, origin):
+    """
+    Return (first, offsets), where offsets[i] is a position mirrored into
+    room first + i along one axis, relative to origin, up to room last.
+    """
+    index = np.arange(first, last + 1, dtype=np.int64)
+    return first, index * dim + np.where(index & 1, dim - position, position) - origin
+
+
+def axis_hits(rows, axes, distance, quadrant, inner=0):
+    """
+    Return the nearest hit in each direction of a quadrant, as a table of
+    (bearing x, bearing y, distance^2, kind, x, y) arrays sorted by bearing,
+    from only the given rows of rooms, or only hits further than inner.
+
+    Axes holds a (kind, x axis, y axis) for you and the guard, each axis
+    from mirrored_axis() covering every room in the rows.
+    """
+    limit = distance * distance
+    inner_limit = inner * inner
+    tables, pending = [], 0
+
+    for batch in batches(rows, BATCH_SIZE):
+        # Room indices for every room in the batch of rows
+        y, first, last = (np.array(column, dtype=np.int64) for column in zip(*batch))
+        lengths = last - first + 1
+        starts = np.cumsum(lengths) - lengths
+        y = np.repeat(y, lengths)
+        x = np.repeat(first - starts, lengths) + np.arange(lengths.sum())
+
+        for kind, (x_first, x_offsets), (y_first, y_offsets) in axes:
+            dx = x_offsets[x - x_first]
+            dy = y_offsets[y - y_first]
+            d = dx * dx + dy * dy
+
+            # Hits in range and in the quadrant
+            mask = (d <= limit) & (d > inner_limit) & in_quadrant(quadrant, dx, dy)
+            dx, dy, d = dx[mask], dy[mask], d[mask]
+
+            g = np.gcd(dx, dy)
+            tables.append(nearest((
+                dx // g, dy // g, d, np.full(len(d), kind, dtype=np.int8), x[mask], y[mask]
+            )))
+
+            # Merge the tables as they grow, to keep memory down
+            pending += len(d)
+            if pending > 4 * BATCH_SIZE:
+                tables = [nearest(concatenate(tables))]
+                pending = len(tables[0][0])
+
+    if not tables:
+        return tuple(np.zeros(0, dtype=np.int64) for column in range(6))
+
+    return nearest(concatenate(tables))
+
+
+def numpy_hits(dimensions, you, guard, distance, quadrant, rows=None, inner=0):
+    """
+    Return the nearest hit in each direction of a quadrant, as a table of
+    (bearing x, bearing y, distance^2, kind, x, y) arrays sorted by bearing,
+    optionally only from some of its rows, or only hits further than inner.
+    """
+    x_dim, y_dim = dimensions
+    if rows is None:
+        rows = quadrant_rows(dimensions, you, distance, quadrant)
+    if not rows:
+        return axis_hits(rows, [], distance, quadrant, inner)
+
+    # Mirror each position along just the rooms the rows cover
+    x_first = min(row[1] for row in rows)
+    x_last = max(row[2] for row in rows)
+    y_first = min(row[0] for row in rows)
+    y_last = max(row[0] for row in rows)
+
+    axes = [
+        (kind,
+         mirrored_axis(px, x_dim, x_first, x_last, you[0]),
+         mirrored_axis(py, y_dim, y_first, y_last, you[1]))
+        for kind, (px, py) in ((YOU, you), (GUARD, guard))
+    ]
+    return axis_hits(rows, axes, distance, quadrant, inner)
+
+
+def band_hits(args):
+    """
+    Return the table of nearest hits for a band of rows in a quadrant.
+
+    Takes a single (dimensions, you, guard, distance, quadrant, rows[, inner]) tuple,
+    so it can be mapped over worker processes.
+    """
+    if np is not None:
+        return numpy_hits(*args)
+    return python_hits(*args)
+
+
+def merge_hits(tables):
+    """ Return the tables of hits merged into one, keeping the nearest hits. """
+    if np is not None:
+        return nearest(concatenate(tables))
+
+    hits = {}
+    for table in tables:
+        for bearing, hit in table.items():
+            best = hits.get(bearing)
+            if best is None or hit < best:
+                hits[bearing] = hit
+    return hits
+
+
+def guard_hits(table):
+    """ Return the number of bearings in a table of hits that hit the guard. """
+    if np is not None:
+        return int(np.count_nonzero(table[3] == GUARD))
+    return sum(1 for hit in table.values() if hit[1] == GUARD)
+
+
+def ring_shots(dimensions, you, guard, distance, inner, outer, seen, count_only=False):
+    """
+    Return the shots with inner < distance <= outer, sorted by distance then
+    bearing, skipping bearings already seen in a nearer ring, along with the
+    bearings seen so far. If count_only is given, just the number of shots
+    is returned, without sorting them.
+    """
+    tables = [
+        band_hits((
+            dimensions, you, guard, outer, quadrant,
+            quadrant_rows(dimensions, you, outer, quadrant, inner), inner
+        ))
+        for quadrant in range(len(QUADRANTS))
+    ]
+
+    if np is None:
+        if count_only:
+            count = 0
+            for table in tables:
+                for bearing, hit in table.items():
+                    if bearing not in seen:
+                        seen.add(bearing)
+                        if hit[1] == GUARD:
+                            count += 1
+            return count, seen
+
+        hits = sorted(
+            (d, bearing, kind, (x, y))
+            for table in tables
+            for bearing, (d, kind, x, y) in table.items()
+            if bearing not in seen
+        )
+        seen.update(bearing for d, bearing, kind, room in hits)
+
+        return [
+            Shot(bearing, math.sqrt(d), room)
+            for d, bearing, kind, room in hits if kind == GUARD
+        ], seen
+
+    # Quadrants never share a bearing, so their tables can just be joined
+    bx, by, d, kind, x, y = concatenate(tables)
+
+    # Bearings as single keys, to look up those already seen
+    size = 2 * distance + 1
+    keys = (bx + distance) * size + (by + distance)
+    fresh = ~np.isin(keys, seen)
+    seen = np.concatenate((seen, keys[fresh]))
+
+    mask = fresh & (kind == GUARD)
+    if count_only:
+        return int(np.count_nonzero(mask)), seen
+
+    bx, by, d, x, y = bx[mask], by[mask], d[mask], x[mask], y[mask]
+    order = np.lexsort((by, bx, d))
+
+    bearings = zip(bx[order].tolist(), by[order].tolist())
+    rooms = zip(x[order].tolist(), y[order].tolist())
+    return map(Shot, bearings, np.sqrt(d[order]).tolist(), rooms), seen
+
+
+def rings(dimensions, your_position, guard_position, distance, count_only=False):
+    """
+    Yield the result of ring_shots() for each ring, nearest first.
+
+    The circle is searched in rings that double in radius, so the first
+    shots are found after mirroring only a small part of the grid.
+    """
+    dimensions = tuple(dimensions)
+    you = tuple(your_position)
+    guard = tuple(guard_position)
+
+    seen = set() if np is None else np.zeros(0, dtype=np.int64)
+    inner, outer = 0, max(dimensions)
+
+    while inner < distance:
+        outer = min(outer, distance)
+        shots, seen = ring_shots(dimensions, you, guard, distance, inner, outer, seen, count_only)
+        yield shots
+        inner, outer = outer, 2 * outer
+
+
+def firing_solutions(dimensions, your_position, guard_position, distance):
+    """
+    Yield a Shot for each distinct direction that hits the guard, nearest
+    first (then by bearing). A shot bounces abs(x) + abs(y) times on its way
+    to room (x, y).
+    """
+    for shots in rings(dimensions, your_position, guard_position, distance):
+        for shot in shots:
+            yield shot
+
+
+def count_shots(dimensions, your_position, guard_position, distance):
+    """
+    Return the number of shots firing_solutions() would yield, counted ring
+    by ring without sorting them or building each Shot.
+    """
+    return sum(rings(dimensions, your_position, guard_position, distance, count_only=True))
+
+
+def count_directions(dimensions, your_position, guard_position, distance, processes=None):
+    """
+    Return the number of distinct directions that hit the guard.
+
+    Unlike solution(), there are no limits on the room or distance. The rows
+    of each quadrant are split into bands of about BAND_SIZE rooms, which
+    are solved in a pool of processes if processes is given. The result is
+    the same either way.
+    """
+    dimensions = tuple(dimensions)
+    you = tuple(your_position)
+    guard = tuple(guard_position)
+
+    bands = [
+        (dimensions, you, guard, distance, quadrant, band)
+        for quadrant in range(len(QUADRANTS))
+        for band in batches(quadrant_rows(dimensions, you, distance, quadrant), BAND_SIZE)
+    ]
+
+    pool = None
+    if processes:
+        from multiprocessing import Pool
+        pool = Pool(processes)
+
+    try:
+        if pool:
+            tables = pool.imap(band_hits, bands)
+        else:
+            tables = (band_hits(band) for band in bands)
+
+        # Merge each quadrant's bands as they arrive, in order
+        merged = [None] * len(QUADRANTS)
+        for band, table in zip(bands, tables):
+            quadrant = band[4]
+            if merged[quadrant] is not None:
+                table = merge_hits([merged[quadrant], table])
+            merged[quadrant] = table
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    return sum(guard_hits(table) for table in merged)
+
+
+class GuardFightRoom:
+    """
+    A room that answers many queries, sharing the mirrored rooms between
+    them.
+
+    The offset and reflection parity of each mirrored room only depend on
+    the dimensions, so they are kept for the furthest reach asked for so
+    far and sliced down for nearer ones. Queries with the same positions
+    are solved once, at the longest of their distances.
+    """
+
+    def __init__(self, dimensions):
+        self.dimensions = tuple(dimensions)
+        self.reach = (0, 0)
+        self.axes = None
+
+    def reserve(self, distance):
+        """
+        Grow the mirrored rooms to cover distance, and return how many rooms
+        out from your own that needs along each axis.
+        """
+        reach = tuple(distance // dim + 1 for dim in self.dimensions)
+
+        if self.axes is None or reach[0] > self.reach[0] or reach[1] > self.reach[1]:
+            self.reach = tuple(max(n, cached) for n, cached in zip(reach, self.reach))
+            self.axes = []
+            for dim, n in zip(self.dimensions, self.reach):
+                index = np.arange(-n, n + 1, dtype=np.int64)
+                self.axes.append((index * dim, (index & 1) == 1))
+
+        return reach
+
+    def mirrored(self, axis, n, position, origin):
+        """
+        Return a position mirrored into each room out to n rooms along an
+        axis, relative to origin, as an axis for axis_hits().
+        """
+        offset, odd = self.axes[axis]
+        dim = self.dimensions[axis]
+
+        rooms = slice(self.reach[axis] - n, self.reach[axis] + n + 1)
+        return -n, offset[rooms] + np.where(odd[rooms], dim - position, position) - origin
+
+    def guard_distances(self, you, guard, distance):
+        """
+        Return the sorted distances^2 of the directions that hit the guard
+        within distance.
+        """
+        if np is None:
+            return sorted(
+                hit[0]
+                for quadrant in range(len(QUADRANTS))
+                for hit in python_hits(self.dimensions, you, guard, distance, quadrant).values()
+                if hit[1] == GUARD
+            )
+
+        reach = self.reserve(distance)
+        axes = [
+            (kind,
+             self.mirrored(0, reach[0], position[0], you[0]),
+             self.mirrored(1, reach[1], position[1], you[1]))
+            for kind, position in ((YOU, you), (GUARD, guard))
+        ]
+
+        # Quadrants never share a bearing, so their tables can just be joined
+        tables = [
+            axis_hits(quadrant_rows(self.dimensions, you, distance, quadrant), axes, distance, quadrant)
+            for quadrant in range(len(QUADRANTS))
+        ]
+        bx, by, d, kind, x, y = concatenate(tables)
+        return np.sort(d[kind == GUARD])
+
+    def solve(self, queries):
+        """
+        Return the number of distinct directions that hit the guard for each
+        (your_position, guard_position, distance) query. As with
+        count_directions(), there are no limits on the room or distance.
+        """
+        queries = list(queries)
+
+        groups = {}
+        for i, (you, guard, distance) in enumerate(queries):
+            groups.setdefault((tuple(you), tuple(guard)), []).append(i)
+
+        counts = [0] * len(queries)
+        for (you, guard), indices in groups.items():
+            # The nearest hit in each direction doesn't depend on the
+            # distance, so the longest covers all the others
+            d = self.guard_distances(you, guard, max(queries[i][2] for i in indices))
+            for i in indices:
+                counts[i] = bisect_right(d, queries[i][2] ** 2)
+
+        return counts
+
+    def count(self, your_position, guard_position, distance):
+        """ Return the number of distinct directions that hit the guard. """
+        return self.solve([(your_position, guard_position, distance)])[0]
+
+
+def solution(dimensions, your_position, guard_position, distance, processes=None):
     # Initial bounds checks
     if (
         dimensions[0] <= 1 or
@@ -179,52 +795,7 @@ def solution(dimensions, your_position, guard_position, distance):
     if distance < you.distance(guard):
         return 0
 
-    # Get room dimensions
-    x_dim, y_dim = dimensions
-
-    # Setup mirrors to cover every increment of room size across all cardinal
-    # directions
-    x_mirrors = int(distance / x_dim) + 1
-    y_mirrors = int(distance / y_dim) + 1
-
-    # Dictionary of hits
-    # - keyed on bearing of the hit
-    # - whether it was yourself or the guard
-    # - distance from yourself (only nearest stored, with you>guard)
-    hits = {}
-
-    # Loop through each room in turn and determine if a bullet hits yourself
-    # and/or the guard
-    for y in range(-y_mirrors, y_mirrors + 1):
-
-        for x in range(-x_mirrors, x_mirrors +1):
-
-            # Lambda to calculate mirrored position relative to yourself
-            project = lambda P: Point2(
-                x * x_dim + (P.x if x & 1 == 0 else x_dim - P.x) - you.x,
-                y * y_dim + (P.y if y & 1 == 0 else y_dim - P.y) - you.y
-            )
-
-            # Check for a collision with your mirrored position
-            # - distance <= max distance
-            # - closest hit this bearing (allow for you>guard)
-            if x or y:  # No need to check original room
-                mirror = project(you)
-                d = mirror.magnitude()  # Same as mirror.distance([0,0])
-                if d <= distance:
-                    a = mirror.direction()
-                    if a not in hits or hits[a][1] >= d:
-                        hits[a] = (False, d)
-
-            # Check for a collision with the guard's mirrored position
-            # - distance <= max distance
-            # - closest guard hit this bearing
-            mirror = project(guard)
-            d = mirror.magnitude()
-            if d <= distance:
-                a = mirror.direction()
-                if a not in hits or hits[a][1] > d:
-                    hits[a] = (True, d)
-
     # Return the number of directions that hit the guard
-    return sum(1 for v in hits.values() if v[0])
+    if processes:
+        return count_directions(dimensions, your_position, guard_position, distance, processes)
+    return count_shots(dimensions, your_position, guard_position, distance)
@@ -0,0 +1,38 @@
+import solution
+
+def answer(dimensions, your_position, guard_position, distance):
+    res = solution.solution(dimensions, your_position, guard_position, distance)
+    print(res)
+    return res
+
+assert (
+    answer([3, 2], [1, 1], [2, 1], 4) == 7
+)
+
+assert (
+    answer([300, 275], [150, 150], [185, 100], 500) == 9
+)
+
+assert (
+    answer([2, 5], [1, 2], [1, 4], 11) == 27
+)
+
+assert (
+    answer([10, 10], [4, 4], [3, 3], 5000) == 739323
+)
+
+# The stream of firing solutions finds the same directions as a single pass
+for args in (
+    ([3, 2], [1, 1], [2, 1], 4),
+    ([300, 275], [150, 150], [185, 100], 500),
+    ([10, 10], [2, 3], [5, 7], 300),
+    ([7, 3], [2, 1], [5, 2], 777),
+    ([2, 5], [1, 2], [1, 4], 1000),
+):
+    count = solution.count_directions(*args)
+    assert sum(1 for shot in solution.firing_solutions(*args)) == count
+    assert solution.count_shots(*args) == count
+
+# Shots come nearest first
+shots = list(solution.firing_solutions([3, 2], [1, 1], [2, 1], 4))
+assert [shot.distance for shot in shots] == sorted(shot.distance for shot in shots)
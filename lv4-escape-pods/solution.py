@@ -97,121 +97,518 @@ Multi source multi sink
             {1,2,4,6,7}: the blocking capacity is 2
 
         So, the max flow is 16.
+
+    Rather than copy the path into a bigger matrix, the synthetic nodes are
+    added to the graph as extra nodes n and n + 1. An "infinite" capacity is
+    just the total capacity out of an entrance, or into an exit.
+
+Residual graph
+==============
+
+    Most rooms only have a few corridors, so rather than n x n capacity and
+    flow matrices the graph is stored as parallel arrays of edges (a
+    "forward star"), which only grow with the number of corridors:
+
+        head[u]       first edge out of room u
+        next_edge[e]  next edge out of the same room as edge e
+        to[e]         room edge e leads to
+        cap[e]        capacity of edge e
+        flow[e]       flow along edge e
+
+    Edges are added in pairs, so the reverse of edge e is always e ^ 1,
+    with no capacity and flow[e ^ 1] == -flow[e]. The residual capacity of
+    edge e is cap[e] - flow[e].
+
+Incremental updates
+===================
+
+    A FlowNetwork keeps its flow between changes, so only the difference
+    needs finding again:
+
+        - Raising a capacity leaves the flow valid, so the engine just
+          carries on from it.
+        - Lowering the capacity of edge (a, b) below its flow by d leaves a
+          with d too many bunnies and b with d too few. As much as possible
+          is rerouted from a to b, and the rest is cancelled back along the
+          residual graph from t to b, and from a to s.
+
+    Once the flow is maximal, the rooms still reachable from s in the
+    residual graph are one side of a minimum cut, and the saturated
+    corridors leaving them are the bottleneck.
+
+Engines
+=======
+
+    Each augmenting path search in Ford-Fulkerson depends on the capacities,
+    so one of the following engines is used instead.
+
+    Edmonds-Karp:
+        Ford-Fulkerson, where each augmenting path is a shortest path found
+        by a BFS. O(VE^2).
+
+    Dinic:
+        1. Use a BFS to build a level graph, where each node is labelled
+           with its distance from s in the residual graph
+        2. Use a DFS to send a blocking flow along edges that go up a level,
+           skipping edges that are saturated or lead to dead ends
+        3. Repeat until t can no longer be reached
+        O(V^2E), and much less for unit-like corridor graphs.
+
+    Push-relabel (FIFO):
+        1. Saturate every edge out of s, so its neighbours have an excess
+        2. Push excess from each active node to a neighbour one step lower,
+           or relabel it one step higher than its lowest neighbour
+        3. When no node is left at a height (a gap), every node above it
+           can't reach t, so lift them above s
+        O(V^3).
 """
 
-INF = 0x40000
+from array import array
+from collections import deque
+
+# Capacity of the synthetic edges in a FlowNetwork, above any possible flow
+INF = 1 << 62
+
+
+class FlowGraph:
+    """ A residual graph stored as parallel arrays of paired edges. """
+
+    def __init__(self, size):
+        self.size = size
+        self.head = array('l', [-1]) * size
+        self.next_edge = array('l')
+        self.to = array('l')
+        self.cap = array('l')
+        self.flow = array('l')
+
+    def add_edge(self, u, v, c):
+        """ Add an edge from u to v with capacity c, and its reverse. """
+        for u, v, c in ((u, v, c), (v, u, 0)):
+            self.next_edge.append(self.head[u])
+            self.head[u] = len(self.to)
+            self.to.append(v)
+            self.cap.append(c)
+            self.flow.append(0)
+
+    def edges(self, u):
+        """ Return an iterator of the edges out of u. """
+        e = self.head[u]
+        while e >= 0:
+            yield e
+            e = self.next_edge[e]
+
+    @classmethod
+    def from_edges(cls, size, edges, entrances, exits):
+        """
+        Return the graph for size rooms linked by (u, v, capacity) edges, with
+        a synthetic source linked to the entrances and a synthetic sink linked
+        from the exits.
+        """
+        graph = cls(size + 2)
+        outflow = array('l', [0]) * size
+        inflow = array('l', [0]) * size
+
+        for u, v, c in edges:
+            if c and u != v:
+                graph.add_edge(u, v, c)
+                outflow[u] += c
+                inflow[v] += c
+
+        for u in entrances:
+            graph.add_edge(size, u, outflow[u])
+        for v in exits:
+            graph.add_edge(v, size + 1, inflow[v])
+
+        graph.source, graph.sink = size, size + 1
+        return graph
+
+    @classmethod
+    def from_matrix(cls, entrances, exits, path):
+        """ Return the graph for a path matrix, without copying it. """
+        return cls.from_edges(
+            len(path),
+            ((u, v, c) for u, row in enumerate(path) for v, c in enumerate(row) if c),
+            entrances,
+            exits
+        )
+
+
+def bfs(graph, s, t):
+    """
+    Return the list of edges on a shortest path from s to t in the residual
+    graph, or None if t can't be reached.
+    """
+    head, next_edge, to = graph.head, graph.next_edge, graph.to
+    cap, flow = graph.cap, graph.flow
 
+    # Edge used to reach each node
+    parent = array('l', [-1]) * graph.size
+    parent[s] = -2
 
-def transform(entrances, exits, path):
-    """ Transform a multi source multi sink graph into source and sink. """
+    queue = deque([s])
+    while queue:
+        u = queue.popleft()
+        e = head[u]
+        while e >= 0:
+            v = to[e]
+            if cap[e] > flow[e] and parent[v] == -1:
+                parent[v] = e
+                if v == t:
+                    # Walk back to s
+                    path = []
+                    while v != s:
+                        e = parent[v]
+                        path.append(e)
+                        v = to[e ^ 1]
+                    return path[::-1]
+                queue.append(v)
+            e = next_edge[e]
 
-    # Add dummy source and sink nodes
-    path = (
-        [[0] * (len(path) + 2)] +
-        [[0] + row + [0] for row in path] +
-        [[0] * (len(path) + 2)]
-    )
+    # Sink wasn't reached
+    return None
 
-    # Link dummy source to previous source nodes
-    for u in entrances:
-        path[0][u + 1] = INF
 
-    # Link dummy sink to previous sink nodes
-    for u in exits:
-        path[u + 1][-1] = INF
+def augment(graph, path, limit=None):
+    """ Send as much flow as possible (up to limit) along a path, and return how much. """
+    cap, flow = graph.cap, graph.flow
 
-    # Set a single entrance and exit
-    entrances = [0]
-    exits = [len(path) - 1]
+    # The maximum flow for this path is its blocking capacity
+    path_flow = min(cap[e] - flow[e] for e in path)
+    if limit is not None and limit < path_flow:
+        path_flow = limit
 
-    return entrances, exits, path
+    # Update the residual graph
+    for e in path:
+        flow[e] += path_flow
+        flow[e ^ 1] -= path_flow
 
+    return path_flow
 
-def bfs(C, F, s, t):
-    """
-    Returns a path if there is a route from s to t in the residual graph.
 
-    Utilises a greedy algorithm to try and maximise the flow capacity each
-    path iteration.
+def edmonds_karp(graph, s, t):
+    """ Return the maximum flow from s to t, using shortest augmenting paths. """
+    total = 0
 
-    For each node:
-    - loop through each possible path from this node
-    - check next node has not been previously visited
-    - check flow capacity > 0
-    - select largest maximum capacity
-    """
+    while True:
+        path = bfs(graph, s, t)
 
-    # Special case for source and sink being the same
-    if s == t:
-        return [s]
+        if not path:
+            return total
 
-    # List of nodes for this path
-    path = []
+        total += augment(graph, path)
 
-    # A simple queue of steps
-    queue = [s]  # Start with the source
 
-    # Simple BFS loop
-    while queue:
-        u = queue.pop(0)
+def dinic(graph, s, t):
+    """ Return the maximum flow from s to t, using Dinic's algorithm. """
+    head, next_edge, to = graph.head, graph.next_edge, graph.to
+    cap, flow = graph.cap, graph.flow
+    total = 0
 
-        path.append(u)
+    while True:
+        # Build the level graph
+        level = array('l', [-1]) * graph.size
+        level[s] = 0
+        queue = deque([s])
+        while queue:
+            u = queue.popleft()
+            if level[t] >= 0 and level[u] >= level[t]:
+                break  # Nothing further can lead to t
+            e = head[u]
+            while e >= 0:
+                v = to[e]
+                if cap[e] > flow[e] and level[v] < 0:
+                    level[v] = level[u] + 1
+                    queue.append(v)
+                e = next_edge[e]
+
+        if level[t] < 0:
+            return total
+
+        # Next edge to try from each node
+        current = array('l', head)
+
+        # Send a blocking flow, one path at a time
+        path = []
+        u = s
+        while True:
+            while u != t:
+                e = current[u]
+                while e >= 0 and not (cap[e] > flow[e] and level[to[e]] == level[u] + 1):
+                    e = next_edge[e]
+                current[u] = e
+
+                if e >= 0:
+                    # Advance
+                    path.append(e)
+                    u = to[e]
+                elif u == s:
+                    break
+                else:
+                    # Dead end, so retreat and skip the edge into it
+                    level[u] = -1
+                    u = to[path.pop() ^ 1]
+                    current[u] = next_edge[current[u]]
+
+            if u != t:
+                break
+
+            total += augment(graph, path)
+
+            # Carry on from before the first saturated edge
+            j = next(j for j, e in enumerate(path) if cap[e] == flow[e])
+            u = to[path[j] ^ 1]
+            del path[j:]
+
+
+def push_relabel(graph, s, t):
+    """
+    Return the maximum flow from s to t, using FIFO push-relabel.
 
-        # Search for largest unvisited node
-        next = max = 0
-        for v, cf in enumerate(C[u]):
-            if v in path or C[u][v] == 0:
+    As well as the gap heuristic, every node is relabelled with its exact
+    distance to t at the start, and again after every n relabels.
+    """
+    head, next_edge, to = graph.head, graph.next_edge, graph.to
+    cap, flow = graph.cap, graph.flow
+    n = graph.size
+
+    height = array('l', [0]) * n
+    excess = [0] * n
+    current = array('l', head)
+
+    # Number of nodes at each height, to find gaps
+    count = array('l', [0]) * (2 * n + 1)
+
+    def global_relabel():
+        """ Set each height to its distance to t, or above s if it can't reach t. """
+        distance = array('l', [-1]) * n
+        distance[t] = 0
+        queue = deque([t])
+        while queue:
+            v = queue.popleft()
+            e = head[v]
+            while e >= 0:
+                u = to[e]
+                if distance[u] < 0 and cap[e ^ 1] > flow[e ^ 1] and u != s:
+                    distance[u] = distance[v] + 1
+                    queue.append(u)
+                e = next_edge[e]
+
+        for u in range(n):
+            if u == s:
+                continue
+            count[height[u]] -= 1
+            height[u] = distance[u] if distance[u] >= 0 else max(height[u], n + 1)
+            count[height[u]] += 1
+            current[u] = head[u]
+
+    count[0] = n - 1
+    count[n] = 1
+    height[s] = n
+    global_relabel()
+
+    # Saturate every edge out of the source
+    queue = deque()
+    for e in graph.edges(s):
+        d = cap[e] - flow[e]
+        if d > 0:
+            v = to[e]
+            flow[e] += d
+            flow[e ^ 1] -= d
+            if not excess[v] and v != t:
+                queue.append(v)
+            excess[v] += d
+            excess[s] -= d
+
+    relabels = 0
+    while queue:
+        u = queue.popleft()
+
+        # Discharge u
+        while excess[u]:
+            e = current[u]
+
+            if e < 0:
+                # Relabel one above the lowest residual neighbour
+                old = height[u]
+                lowest = 2 * n
+                e = head[u]
+                while e >= 0:
+                    if cap[e] > flow[e] and height[to[e]] + 1 < lowest:
+                        lowest = height[to[e]] + 1
+                    e = next_edge[e]
+                height[u] = lowest
+                count[old] -= 1
+                count[lowest] += 1
+                current[u] = head[u]
+
+                # Gap, so nodes above it can't reach the sink
+                if not count[old] and old < n:
+                    for v in range(n):
+                        if old < height[v] < n:
+                            count[height[v]] -= 1
+                            height[v] = n + 1
+                            count[n + 1] += 1
+
+                relabels += 1
+                if relabels % n == 0:
+                    global_relabel()
                 continue
-            cf = C[u][v] - F[u][v]
-            if cf > 0 and cf > max:
-                max = cf
-                next = v
-
-        # If sink was reached return the path
-        if next == t:
-            return path
-
-        # If a valid node was found add it to the queue
-        if max:
-            queue.append(next)
-
-    # Sink wasn't reached
-    return None
-
-
-def solution(entrances, exits, path):
-    # Check if multi source or multi sink and transform if necessary
-    if len(entrances) > 1 or len(exits) > 1:
-        entrances, exits, path = transform(entrances, exits, path)
-
-    # Source and sink nodes
-    s = entrances[0]
-    t = exits[0]
-
-    # Capacity and flow graphs
-    C = path[:]
-    F = [[0] * len(C) for j in range(len(C))]
 
-    while True:
-        # Use BFS to find a path from s to t
-        path = bfs(C, F, s, t)
+            v = to[e]
+            d = cap[e] - flow[e]
+            if d > 0 and height[u] == height[v] + 1:
+                # Push as much as possible
+                if d > excess[u]:
+                    d = excess[u]
+                flow[e] += d
+                flow[e ^ 1] -= d
+                excess[u] -= d
+                if not excess[v] and v != s and v != t:
+                    queue.append(v)
+                excess[v] += d
+            else:
+                current[u] = next_edge[e]
+
+    return excess[t]
+
+
+# Available max flow engines
+ENGINES = {
+    'edmonds_karp': edmonds_karp,
+    'dinic': dinic,
+    'push_relabel': push_relabel,
+}
+
+
+class FlowNetwork:
+    """
+    A max flow problem that keeps its flow as corridors and entrances or
+    exits are changed, so it can be re-optimized rather than solved again.
+    """
 
-        if not path:
-            break
-
-        # Find the maximum flow for this path, which is actually
-        # the minimum/blocking capacity for the path
-        path_flow = min([
-            C[path[j]][path[j + 1]] - F[path[j]][path[j + 1]]
-            for j in range(len(path) - 1)
-        ])
-
-        # Update the residual graph with the max flow for this path
-        for j in range(len(path) - 1):
-            u, v = path[j], path[j + 1]
-            F[u][v] += path_flow
-            F[v][u] -= path_flow
-
-    # Sum of the start row of the flow graph will be equal
-    # to the maximum flow for
-    return sum(F[s][v] for v in range(len(F)))
+    def __init__(self, size, edges=(), entrances=(), exits=(), engine='dinic'):
+        self.size = size
+        self.engine = engine
+        self.graph = FlowGraph(size + 2)
+        self.source, self.sink = size, size + 1
+        self.entrances, self.exits = set(), set()
+
+        # Forward edge for each (u, v) pair
+        self.edge_index = {}
+
+        for u, v, c in edges:
+            if c and u != v:
+                self.update_capacity(u, v, self.capacity(u, v) + c)
+        for u in entrances:
+            self.add_entrance(u)
+        for v in exits:
+            self.add_exit(v)
+
+    @classmethod
+    def from_matrix(cls, entrances, exits, path, engine='dinic'):
+        """ Return the network for a path matrix. """
+        return cls(
+            len(path),
+            ((u, v, c) for u, row in enumerate(path) for v, c in enumerate(row) if c),
+            entrances,
+            exits,
+            engine
+        )
+
+    def capacity(self, u, v):
+        """ Return the capacity of the corridor from u to v. """
+        e = self.edge_index.get((u, v))
+        return 0 if e is None else self.graph.cap[e]
+
+    def push(self, a, b, limit):
+        """ Send up to limit along residual paths from a to b, and return how much. """
+        moved = 0
+        while a != b and moved < limit:
+            path = bfs(self.graph, a, b)
+            if not path:
+                break
+            moved += augment(self.graph, path, limit - moved)
+        return moved
+
+    def set_capacity(self, u, v, c):
+        """ Set the capacity of the edge from u to v, keeping the flow valid. """
+        graph = self.graph
+
+        e = self.edge_index.get((u, v))
+        if e is None:
+            if c:
+                self.edge_index[(u, v)] = len(graph.to)
+                graph.add_edge(u, v, c)
+            return
+
+        graph.cap[e] = c
+
+        # Reroute or cancel any flow over the new capacity
+        d = graph.flow[e] - c
+        if d > 0:
+            graph.flow[e] -= d
+            graph.flow[e ^ 1] += d
+            d -= self.push(u, v, d)
+            if d:
+                self.push(self.sink, v, d)
+                self.push(u, self.source, d)
+
+    def update_capacity(self, u, v, c):
+        """ Set the capacity of the corridor from u to v. """
+        if not 0 <= u < self.size or not 0 <= v < self.size:
+            raise ValueError('No such room')
+        if u != v:
+            self.set_capacity(u, v, c)
+
+    def add_entrance(self, u):
+        self.entrances.add(u)
+        self.set_capacity(self.source, u, INF)
+
+    def remove_entrance(self, u):
+        self.entrances.discard(u)
+        self.set_capacity(self.source, u, 0)
+
+    def add_exit(self, v):
+        self.exits.add(v)
+        self.set_capacity(v, self.sink, INF)
+
+    def remove_exit(self, v):
+        self.exits.discard(v)
+        self.set_capacity(v, self.sink, 0)
+
+    def max_flow(self):
+        """ Re-optimize from the current flow, and return the maximum flow. """
+        graph = self.graph
+        ENGINES[self.engine](graph, self.source, self.sink)
+        return sum(graph.flow[e] for e in graph.edges(self.source))
+
+    def min_cut(self):
+        """
+        Return the (u, v) corridors of a minimum cut, which are the ones
+        holding back the maximum flow.
+        """
+        self.max_flow()
+        graph = self.graph
+
+        # Rooms reachable from the source in the residual graph
+        reachable = {self.source}
+        stack = [self.source]
+        while stack:
+            for e in graph.edges(stack.pop()):
+                v = graph.to[e]
+                if graph.cap[e] > graph.flow[e] and v not in reachable:
+                    reachable.add(v)
+                    stack.append(v)
+
+        return sorted(
+            (u, v) for (u, v), e in self.edge_index.items()
+            if u in reachable and v not in reachable and u < self.size and v < self.size
+        )
+
+
+def solution(entrances, exits, path, engine='dinic'):
+    # Build the residual graph, with a single source and sink
+    graph = FlowGraph.from_matrix(entrances, exits, path)
+
+    # The maximum flow through the graph
+    return ENGINES[engine](graph, graph.source, graph.sink)